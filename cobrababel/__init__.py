@@ -1,11 +1,15 @@
-from .bigg import create_bigg_universal_model, get_bigg_model_list, create_cobra_model_from_bigg_model, \
-    get_bigg_metabolite, add_bigg_metabolites, get_bigg_reaction, add_bigg_reactions, \
-    create_bigg_xref, get_bigg_alias_names
+from .bigg import create_bigg_universal_model, update_bigg_universal_model, get_bigg_model_list, \
+    create_cobra_model_from_bigg_model, get_bigg_metabolite, add_bigg_metabolites, get_bigg_reaction, \
+    add_bigg_reactions, create_bigg_xref, get_bigg_alias_names, create_bigg_mirror, \
+    read_bigg_dump, read_bigg_export, download_bigg_models, load_bigg_models, create_bigg_xref_files, \
+    AliasIndex
 from .metanetx import create_metanetx_universal_model, create_metanetx_metabolite_xref, \
-    create_metanetx_reaction_xref
+    create_metanetx_reaction_xref, create_metanetx_xref_files, save_metanetx_snapshot, load_metanetx_snapshot, \
+    MetaNetXXref, MetaNetXAnnotations, get_metanetx_equation_cache_stats
 from .source import create_universal_model_from_source, load_model_from_file
 from .vmh import create_cobra_model_from_vmh_recon2, create_cobra_model_from_agora_model
 from .kegg.kegg import get_kegg_records, list_kegg_ids, get_kegg_reactions, get_kegg_metabolites, \
     get_kegg_enzymes, get_kegg_amino_acid_seq, get_kegg_dna_seq
 from .compare import compare_models, compare_reactions, compare_metabolites, compare_genes
+from .transport import Transport, get_transport, set_transport
 from .translate import *
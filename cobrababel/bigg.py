@@ -1,31 +1,79 @@
 import requests
 import io
+import json
+import sqlite3
+import re
+from os import makedirs
+from os.path import exists, isdir, join
 from warnings import warn
-from time import sleep
 import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from functools import partial
+from six import string_types, iteritems
 
 from cobra.core import Model, Metabolite, Reaction, DictList
 from cobra.io import load_json_model
 
+from .cache import ResponseCache
+from .transport import get_transport
+from .util import open_gzip_text, replace_file
+
 # Base URL for BiGG website
 bigg_url = 'http://bigg.ucsd.edu/api/v2/'
 
-# Pause after this many requests to BiGG data API
-PAUSE_COUNT = 500
+# Fields from a universal BiGG metabolite used when creating a Metabolite object
+metabolite_fields = ('bigg_id', 'name', 'formula', 'formulae', 'charge', 'charges', 'database_links')
+
+# Prefixes of IDs of pseudo reactions in a BiGG export file which does not flag pseudo reactions
+pseudo_reaction_prefixes = ('BIOMASS', 'EX_', 'DM_', 'SK_', 'ATPM')
+
+# File names of BiGG export files in a source folder
+export_metabolite_file_name = 'bigg_models_metabolites.txt'
+export_reaction_file_name = 'bigg_models_reactions.txt'
+
+# Log progress after downloading this many details from BiGG data API
+PROGRESS_COUNT = 1000
+
+# Commit the records stored in a BiGG mirror after storing this many records
+MIRROR_COMMIT_COUNT = 500
 
 # Logger for this module
 LOGGER = logging.getLogger(__name__)
 
 
-def create_bigg_universal_model(validate=False, ignore_pseudo_reactions=True):
+def create_bigg_universal_model(validate=False, ignore_pseudo_reactions=True, workers=1, cache_folder=None,
+                                journal_file_name=None, resume=False, source=None):
     """ Create an universal model from BiGG universal reactions and metabolites.
 
+    When a source is specified, the universal model is created without any
+    requests to BiGG data API from either a local mirror made by create_bigg_mirror(),
+    a bulk dump file read by read_bigg_dump(), or a folder with the export files
+    from the BiGG website read by read_bigg_export().
+
+    Requests to BiGG data API are limited to the rate for bigg.ucsd.edu in
+    cobrababel.transport.RATE_LIMITS (10 requests per second) no matter how many
+    workers are used. There is one request for each of the roughly 43,000
+    universal metabolites and reactions so downloading the details without a
+    cache takes at least 70 minutes. When the BiGG server allows it, raise the
+    limit with get_transport().set_rate_limit('bigg.ucsd.edu', rate) before
+    creating the model.
+
     Parameters
     ----------
     validate : bool, optional
         When True, perform validity checks on universal COBRA model
     ignore_pseudo_reactions : bool, optional
         When True, do not include pseudo reactions
+    workers : int, optional
+        Number of concurrent requests to BiGG data API when downloading details (up to the rate limit)
+    cache_folder : str, optional
+        Path to folder for caching details between runs with the same BiGG database version
+    journal_file_name : str, optional
+        Path to journal file for recording details as they are downloaded
+    resume : bool, optional
+        When True, skip downloading details already recorded in the journal file
+    source : str, optional
+        Path to local mirror file, bulk dump file, or export folder of BiGG universal metabolites and reactions
 
     Returns
     -------
@@ -33,72 +81,65 @@ def create_bigg_universal_model(validate=False, ignore_pseudo_reactions=True):
         COBRA model object with universal reactions and metabolites
     """
 
-    # Get the current version number for the BiGG database.
-    response = requests.get(bigg_url + 'database_version')
-    if response.status_code != requests.codes.OK:
-        response.raise_for_status()
-    version = response.json()
+    if source is not None:
+        # Get the version and details from a local source file.
+        version, metabolites, reactions = _read_bigg_source(source)
+    else:
+        # Get the current version number for the BiGG database.
+        version = _get_bigg_database_version()
+
+        # Details are only cached for the current version of the BiGG database.
+        cache = _bigg_response_cache(cache_folder, version)
+
+        # Record the details in a journal so an interrupted download can be resumed.
+        journal = None
+        if journal_file_name is not None:
+            journal = _BiggJournal(journal_file_name, version, resume)
+
+        # Close the journal even when a download fails so the records are saved for a resume.
+        try:
+            # Get the details on each universal metabolite. Note there is no bulk download
+            # of universal metabolites so there is separate request to the BiGG server
+            # for each metabolite which makes this very slow.
+            metabolite_list = _get_bigg_universal_list('metabolites')
+            LOGGER.info('Started download of %d metabolites', len(metabolite_list))
+            bigg_metabolites = _download_bigg_objects(partial(get_bigg_metabolite, cache=cache),
+                                                      [x['bigg_id'] for x in metabolite_list], 'metabolite', workers,
+                                                      journal)
+            metabolites = _expand_bigg_metabolites(bigg_metabolites)
+            del bigg_metabolites
+            LOGGER.info('Finished download of metabolites')
+
+            # Get the details on each universal reaction. Remember there is no bulk download
+            # of universal reactions which makes this very slow.
+            reaction_list = _get_bigg_universal_list('reactions')
+            LOGGER.info('Started download of %d reactions', len(reaction_list))
+            reactions = _download_bigg_objects(partial(get_bigg_reaction, cache=cache),
+                                               [x['bigg_id'] for x in reaction_list], 'reaction', workers, journal)
+        finally:
+            if journal is not None:
+                journal.close()
+        LOGGER.info('Finished download of reactions')
 
     # Create an empty model.
     universal = Model('bigg_universal', name='BiGG universal model {0}'.format(version['bigg_models_version']))
     universal.notes['last_updated'] = version['last_updated']
     universal.notes['source'] = 'BiGG'
 
-    # Get the list of universal metabolites.
-    LOGGER.info('Started download of universal metabolite list')
-    response = requests.get(bigg_url + 'universal/metabolites')
-    if response.status_code != requests.codes.OK:
-        response.raise_for_status()
-    metabolite_list = response.json()['results']
-    LOGGER.info('Finished download of universal metabolite list')
-
-    # Get the details on each universal metabolite. Note there is no bulk download
-    # of universal metabolites so there is separate request to the BiGG server
-    # for each metabolite which makes this very slow.
-    LOGGER.info('Started download of %d metabolites', len(metabolite_list))
-    metabolites = list()
-    for index in range(len(metabolite_list)):
-        if index % PAUSE_COUNT == 0:
-            LOGGER.info('Paused at metabolite number %s', index)
-            sleep(1)  # Be nice to BiGG data API and take a breath
-        bigg_metabolite = get_bigg_metabolite(metabolite_list[index]['bigg_id'])
-
-        # Add a metabolite for each unique compartment.
-        compartment_list = set(x['bigg_id'] for x in bigg_metabolite['compartments_in_models'])
-        for compartment in compartment_list:
-            bigg_metabolite['compartment_bigg_id'] = compartment
-            metabolites.append(bigg_metabolite.copy())
-    LOGGER.info('Finished download of metabolites')
-
     # Add the metabolites to the universal model.
     LOGGER.info('Started adding %d Metabolite objects to universal model', len(metabolites))
     add_bigg_metabolites(metabolites, universal)
     LOGGER.info('Finished adding Metabolite objects to universal model')
 
-    # Get the list of universal reactions.
-    LOGGER.info('Started download of universal reaction list')
-    response = requests.get(bigg_url + 'universal/reactions')
-    if response.status_code != requests.codes.OK:
-        response.raise_for_status()
-    reaction_list = response.json()['results']
-    LOGGER.info('Finished download of universal reaction list')
-
-    # Get the details on each universal reaction. Remember there is no bulk download
-    # of universal reactions which makes this very slow.
-    LOGGER.info('Started creating Reaction objects for %d reactions', len(reaction_list))
-    reactions = list()
-    for index in range(len(reaction_list)):
-        if index % PAUSE_COUNT == 0:
-            LOGGER.info('Paused at reaction number %s', index)
-            sleep(1)  # Be nice to BiGG data API and take a breath
-        reactions.append(get_bigg_reaction(reaction_list[index]['bigg_id']))
-    LOGGER.info('Finished creating %d reaction objects', len(reactions))
-
     # Add the reactions to the universal model.
     LOGGER.info('Started adding %d Reaction objects to universal model', len(reactions))
     add_bigg_reactions(reactions, universal, ignore_pseudo_reactions)
     LOGGER.info('Finished adding Reaction objects to universal model')
 
+    # Remember the pseudo reactions that were not included so an update does not download them again.
+    if ignore_pseudo_reactions:
+        universal.notes['ignored_reactions'] = ' '.join(sorted(x['bigg_id'] for x in reactions if x['pseudoreaction']))
+
     # If requested, validate the COBRA model.
     if validate:
         warn('Coming soon')
@@ -106,6 +147,267 @@ def create_bigg_universal_model(validate=False, ignore_pseudo_reactions=True):
     return universal
 
 
+def create_bigg_mirror(file_name, workers=1, cache_folder=None):
+    """ Create or refresh a local mirror of BiGG universal metabolites and reactions.
+
+    The mirror is a SQLite database with the details for every universal
+    metabolite and reaction. When the mirror file exists and is for the current
+    version of the BiGG database, only missing details are downloaded. Use the
+    mirror file as the source when calling create_bigg_universal_model() to
+    create an universal model without network access.
+
+    Parameters
+    ----------
+    file_name : str
+        Path to local mirror file
+    workers : int, optional
+        Number of concurrent requests to BiGG data API when downloading details (up to the rate limit)
+    cache_folder : str, optional
+        Path to folder for caching details between runs with the same BiGG database version
+    """
+
+    version = _get_bigg_database_version()
+    mirror = _BiggMirror(file_name, version)
+    cache = _bigg_response_cache(cache_folder, version)
+
+    # Download the details that are not in the mirror yet and remove the details
+    # for objects that are no longer in the BiGG database. Only the IDs of the
+    # stored objects are read so a refresh does not parse the stored details.
+    # Close the mirror even when a download fails so the stored records are committed.
+    try:
+        for object_type, get_function in [('metabolite', get_bigg_metabolite), ('reaction', get_bigg_reaction)]:
+            id_list = [x['bigg_id'] for x in _get_bigg_universal_list(object_type + 's')]
+            stored_ids = mirror.stored_ids(object_type)
+            download_list = [x for x in id_list if x not in stored_ids]
+            LOGGER.info('Started mirroring %d %ss with %d in mirror', len(id_list), object_type,
+                        len(id_list) - len(download_list))
+            for bigg_id, data in _fetch_bigg_objects(partial(get_function, cache=cache), download_list, object_type,
+                                                     workers):
+                mirror.record(object_type, bigg_id, data)
+            mirror.retain(object_type, id_list)
+            LOGGER.info('Finished mirroring %ss', object_type)
+    finally:
+        mirror.close()
+    return
+
+
+def read_bigg_dump(file_name):
+    """ Read BiGG universal metabolites and reactions from a bulk dump file.
+
+    A dump file has one JSON record per line and can be compressed with gzip
+    when the file name ends with ".gz". The first record has the BiGG database
+    version in the format {"type": "version", "data": {...}} and each following
+    record has the details for one metabolite or reaction in the format
+    {"type": "metabolite", "bigg_id": "...", "data": {...}} where the data is
+    the same as returned by get_bigg_metabolite() or get_bigg_reaction(). A
+    journal file from create_bigg_universal_model() is a valid dump file.
+
+    The file is parsed one line at a time and each universal metabolite is
+    expanded into one metabolite per compartment as it is read.
+
+    Parameters
+    ----------
+    file_name : str
+        Path to bulk dump file
+
+    Returns
+    -------
+    tuple
+        BiGG database version details, list of metabolite data for add_bigg_metabolites(),
+        and list of reaction data for add_bigg_reactions()
+    """
+
+    version = None
+    metabolites = list()
+    reactions = list()
+    LOGGER.info('Started reading BiGG dump file %s', file_name)
+    with _open_bigg_dump(file_name) as handle:
+        for record in _read_bigg_records(handle):
+            if record['type'] == 'metabolite':
+                metabolites.extend(_expand_bigg_metabolites([record['data']]))
+            elif record['type'] == 'reaction':
+                reactions.append(record['data'])
+            elif record['type'] == 'version':
+                version = record['data']
+            else:
+                warn('Skipped record with unknown type "{0}" in dump file {1}'.format(record['type'], file_name))
+    if version is None:
+        raise ValueError('Dump file {0} does not have a BiGG database version record'.format(file_name))
+    LOGGER.info('Finished reading %d metabolites and %d reactions from BiGG dump file',
+                len(metabolites), len(reactions))
+    return version, metabolites, reactions
+
+
+def read_bigg_export(metabolite_file_name, reaction_file_name):
+    """ Read BiGG universal metabolites and reactions from the export files on the BiGG website.
+
+    BiGG publishes the universal metabolites and reactions as tab separated files
+    named "bigg_models_metabolites.txt" and "bigg_models_reactions.txt". The
+    metabolite file has one line for each metabolite in each compartment and the
+    reaction file has the reaction string and database links for each reaction.
+    The files do not have formulas, charges, or the BiGG database version and
+    do not flag pseudo reactions so a reaction is a pseudo reaction when its ID
+    starts with one of the prefixes in pseudo_reaction_prefixes. The files can
+    be compressed with gzip when the file names end with ".gz".
+
+    Parameters
+    ----------
+    metabolite_file_name : str
+        Path to BiGG metabolite export file
+    reaction_file_name : str
+        Path to BiGG reaction export file
+
+    Returns
+    -------
+    tuple
+        BiGG database version details, list of metabolite data for add_bigg_metabolites(),
+        and list of reaction data for add_bigg_reactions()
+    """
+
+    LOGGER.info('Started reading BiGG export files %s and %s', metabolite_file_name, reaction_file_name)
+    metabolites = list()
+    required_fields = ['bigg_id', 'universal_bigg_id', 'name', 'database_links']
+    for line_number, fields in _read_bigg_export_file(metabolite_file_name, required_fields):
+        if not fields['bigg_id'].startswith(fields['universal_bigg_id'] + '_'):
+            warn('Skipped metabolite {0} without a compartment on line {1} of export file {2}'
+                 .format(fields['bigg_id'], line_number, metabolite_file_name))
+            continue
+        metabolites.append({
+            'bigg_id': fields['universal_bigg_id'],
+            'name': fields['name'],
+            'compartment_bigg_id': fields['bigg_id'][len(fields['universal_bigg_id']) + 1:],
+            'database_links': _parse_bigg_export_links(fields['database_links'])
+        })
+
+    reactions = list()
+    required_fields = ['bigg_id', 'name', 'reaction_string', 'database_links']
+    for line_number, fields in _read_bigg_export_file(reaction_file_name, required_fields):
+        try:
+            metabolites_list, bounds = _parse_bigg_reaction_string(fields['reaction_string'])
+        except ValueError as e:
+            warn('Skipped reaction {0} on line {1} of export file {2}: {3}'
+                 .format(fields['bigg_id'], line_number, reaction_file_name, e))
+            continue
+        reactions.append({
+            'bigg_id': fields['bigg_id'],
+            'name': fields['name'],
+            'pseudoreaction': fields['bigg_id'].startswith(pseudo_reaction_prefixes),
+            'reaction_string': fields['reaction_string'],
+            'metabolites': metabolites_list,
+            'results': [{'lower_bound': bounds[0], 'upper_bound': bounds[1]}],
+            'database_links': _parse_bigg_export_links(fields['database_links'])
+        })
+
+    # The export files do not have the version of the BiGG database.
+    version = {'bigg_models_version': 'unknown', 'last_updated': 'unknown'}
+    LOGGER.info('Finished reading %d metabolites and %d reactions from BiGG export files',
+                len(metabolites), len(reactions))
+    return version, metabolites, reactions
+
+
+def update_bigg_universal_model(existing, ignore_pseudo_reactions=True, workers=1, cache_folder=None):
+    """ Update an universal model created from BiGG with the current universal reactions and metabolites.
+
+    The lists of universal metabolites and reactions are compared to the model
+    so details are only downloaded for metabolites and reactions that were added
+    to the BiGG database. Metabolites and reactions that were removed from the
+    BiGG database are removed from the model. Pseudo reactions that were not
+    included in the model are listed in the "ignored_reactions" note and are not
+    downloaded again. The model is updated in place.
+
+    Parameters
+    ----------
+    existing : cobra.core.Model
+        COBRA model object created by create_bigg_universal_model()
+    ignore_pseudo_reactions : bool, optional
+        When True, do not include pseudo reactions
+    workers : int, optional
+        Number of concurrent requests to BiGG data API when downloading details (up to the rate limit)
+    cache_folder : str, optional
+        Path to folder for caching details between runs with the same BiGG database version
+
+    Returns
+    -------
+    cobra.core.Model
+        Updated COBRA model object with universal reactions and metabolites
+    """
+
+    if existing.notes.get('source') != 'BiGG':
+        warn('Model {0} ({1}) is not a BiGG model'.format(existing.id, existing.name))
+
+    # Nothing to do when the BiGG database has not changed since the model was created.
+    version = _get_bigg_database_version()
+    if existing.notes.get('last_updated') == version['last_updated']:
+        LOGGER.info('Model %s is current with BiGG database updated on %s', existing.id, version['last_updated'])
+        return existing
+
+    cache = _bigg_response_cache(cache_folder, version)
+
+    # Find the metabolites and reactions that were added or removed. Metabolite IDs
+    # in the model have a compartment suffix. Pseudo reactions that were not included
+    # in the model are not added reactions.
+    metabolite_ids = [x['bigg_id'] for x in _get_bigg_universal_list('metabolites')]
+    reaction_ids = [x['bigg_id'] for x in _get_bigg_universal_list('reactions')]
+    current_metabolites = set(metabolite_ids)
+    current_reactions = set(reaction_ids)
+    ignored_reactions = set()
+    if ignore_pseudo_reactions:
+        ignored_reactions = set(existing.notes.get('ignored_reactions', '').split())
+    existing_metabolites = set(met.id.rsplit('_', 1)[0] for met in existing.metabolites)
+    existing_reactions = set(rxn.id for rxn in existing.reactions) | ignored_reactions
+    LOGGER.info('Found %d added and %d removed metabolites', len(current_metabolites - existing_metabolites),
+                len(existing_metabolites - current_metabolites))
+    LOGGER.info('Found %d added and %d removed reactions', len(current_reactions - existing_reactions),
+                len(existing_reactions - current_reactions))
+
+    # Remove the reactions and then the metabolites that are no longer in the BiGG database.
+    existing.remove_reactions([rxn for rxn in existing.reactions if rxn.id not in current_reactions])
+    existing.remove_metabolites([met for met in existing.metabolites
+                                 if met.id.rsplit('_', 1)[0] not in current_metabolites])
+
+    # Download the details for the added metabolites and reactions.
+    bigg_metabolites = _download_bigg_objects(partial(get_bigg_metabolite, cache=cache),
+                                              [x for x in metabolite_ids if x not in existing_metabolites],
+                                              'metabolite', workers)
+    reactions = _download_bigg_objects(partial(get_bigg_reaction, cache=cache),
+                                       [x for x in reaction_ids if x not in existing_reactions],
+                                       'reaction', workers)
+
+    # Remember the added pseudo reactions that are not included in the model.
+    if ignore_pseudo_reactions:
+        ignored_reactions = (ignored_reactions & current_reactions) | \
+            set(x['bigg_id'] for x in reactions if x['pseudoreaction'])
+        existing.notes['ignored_reactions'] = ' '.join(sorted(ignored_reactions))
+        reactions = [x for x in reactions if not x['pseudoreaction']]
+    else:
+        existing.notes.pop('ignored_reactions', None)
+
+    # An added reaction can use an existing metabolite in a compartment that is
+    # not in the model yet so get the details for those metabolites too.
+    downloaded = set(x['bigg_id'] for x in bigg_metabolites)
+    missing = set()
+    for reaction in reactions:
+        for met in reaction['metabolites']:
+            if met['bigg_id'] not in downloaded and \
+                    not existing.metabolites.has_id('{0}_{1}'.format(met['bigg_id'], met['compartment_bigg_id'])):
+                missing.add(met['bigg_id'])
+    bigg_metabolites.extend(_download_bigg_objects(partial(get_bigg_metabolite, cache=cache),
+                                                   sorted(missing), 'metabolite', workers))
+
+    # Add the new metabolites and reactions to the model.
+    metabolites = [x for x in _expand_bigg_metabolites(bigg_metabolites)
+                   if not existing.metabolites.has_id('{0}_{1}'.format(x['bigg_id'], x['compartment_bigg_id']))]
+    LOGGER.info('Started adding %d Metabolite objects to universal model', len(metabolites))
+    add_bigg_metabolites(metabolites, existing)
+    LOGGER.info('Started adding %d Reaction objects to universal model', len(reactions))
+    add_bigg_reactions(reactions, existing, ignore_pseudo_reactions)
+    LOGGER.info('Finished updating universal model')
+
+    existing.name = 'BiGG universal model {0}'.format(version['bigg_models_version'])
+    existing.notes['last_updated'] = version['last_updated']
+    return existing
+
+
 def create_cobra_model_from_bigg_model(bigg_id, validate=False):
     """ Create a COBRA model from a BiGG model.
 
@@ -124,37 +426,23 @@ def create_cobra_model_from_bigg_model(bigg_id, validate=False):
 
     # Download the JSON representation and details of the model from BiGG.
     LOGGER.info('Started download of %s model', bigg_id)
-    response = requests.get('{0}models/{1}'.format(bigg_url, bigg_id))
+    response = get_transport().get('{0}models/{1}'.format(bigg_url, bigg_id))
     if response.status_code != requests.codes.OK:
         response.raise_for_status()
     details = response.json()
 
-    response = requests.get('{0}models/{1}/download'.format(bigg_url, bigg_id))
+    # Convert to a cobra.Model object by decoding the response as it is received
+    # instead of keeping copies of the full response body in memory.
+    response = get_transport().get('{0}models/{1}/download'.format(bigg_url, bigg_id), stream=True)
     if response.status_code != requests.codes.OK:
         response.raise_for_status()
-    LOGGER.info('Finished download of %s model', bigg_id)
-
-    # Convert to a cobra.Model object.
-    with io.StringIO(response.text) as f:
+    response.raw.decode_content = True
+    with io.TextIOWrapper(response.raw, encoding='utf-8') as f:
         model = load_json_model(f)
+    LOGGER.info('Finished download of %s model', bigg_id)
 
     # Add some details to the Model object.
-    model.name = details['organism']
-    model.notes['genome_name'] = details['genome_name']
-    model.notes['reference_type'] = details['reference_type']
-    model.notes['reference_id'] = details['reference_id']
-    model.notes['source'] = 'BiGG'
-
-    # Confirm a few basics.
-    if len(model.reactions) != details['reaction_count']:
-        warn('{0} reactions in model does not equal {1} in model details'
-             .format(len(model.reactions), details['reaction_count']))
-    if len(model.metabolites) != details['metabolite_count']:
-        warn('{0} metabolites in model does not equal {1} in model details'
-             .format(len(model.metabolites), details['metabolite_count']))
-    if len(model.genes) != details['gene_count']:
-        warn('{0} genes in model does not equal {1} in model details'
-             .format(len(model.genes), details['gene_count']))
+    _set_bigg_model_details(model, details)
 
     # If requested, validate the COBRA model.
     if validate:
@@ -163,6 +451,99 @@ def create_cobra_model_from_bigg_model(bigg_id, validate=False):
     return model
 
 
+def download_bigg_models(model_list, folder, workers=4):
+    """ Download BiGG models into a local repository of JSON files.
+
+    The repository folder has a sub-folder for each model with a JSON file for
+    each version of the model and an index.json file with the details of the
+    current version of each model. A model is only downloaded when the last
+    updated date in the model details is different from the repository. When
+    a download fails, the other models are still downloaded and added to the
+    index before the error is raised.
+
+    Parameters
+    ----------
+    model_list : list of dict or list of str
+        List of models from get_bigg_model_list() or list of BiGG model IDs
+    folder : str
+        Path to repository folder
+    workers : int, optional
+        Number of models downloaded concurrently
+
+    Returns
+    -------
+    dict
+        Dictionary keyed by BiGG model ID of path to current JSON file for model
+    """
+
+    if not exists(folder):
+        makedirs(folder)
+    index = _read_bigg_repository_index(folder)
+    id_list = [x if isinstance(x, string_types) else x['bigg_id'] for x in model_list]
+
+    LOGGER.info('Started download of %d models to %s', len(id_list), folder)
+    error = None
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = dict((executor.submit(_download_bigg_model_file, bigg_id, folder, index.get(bigg_id)), bigg_id)
+                       for bigg_id in id_list)
+
+        # Save the index as each model finishes so completed downloads are kept when
+        # a download fails. The first error is raised after the other downloads finish.
+        for future in as_completed(futures):
+            bigg_id = futures[future]
+            try:
+                index[bigg_id] = future.result()
+            except Exception as e:
+                LOGGER.warning('Failed download of %s model: %s', bigg_id, e)
+                if error is None:
+                    error = e
+                continue
+            _write_bigg_repository_index(folder, index)
+    if error is not None:
+        raise error
+    LOGGER.info('Finished download of models to %s', folder)
+
+    return dict((bigg_id, join(folder, index[bigg_id]['file_name'])) for bigg_id in id_list)
+
+
+def load_bigg_models(folder, bigg_ids=None, processes=None):
+    """ Create COBRA models from a local repository of BiGG models.
+
+    Parameters
+    ----------
+    folder : str
+        Path to repository folder created by download_bigg_models()
+    bigg_ids : list of str, optional
+        List of BiGG model IDs to load (default is all models in repository)
+    processes : int, optional
+        Number of worker processes for parsing models (default is number of CPUs)
+
+    Returns
+    -------
+    dict
+        Dictionary keyed by BiGG model ID of cobra.core.Model objects
+    """
+
+    index = _read_bigg_repository_index(folder)
+    if bigg_ids is None:
+        bigg_ids = sorted(index)
+    for bigg_id in bigg_ids:
+        if bigg_id not in index:
+            raise ValueError('Model {0} is not in repository {1}'.format(bigg_id, folder))
+        if not exists(join(folder, index[bigg_id]['file_name'])):
+            raise IOError('Model file {0} for model {1} does not exist in repository {2}'
+                          .format(index[bigg_id]['file_name'], bigg_id, folder))
+
+    LOGGER.info('Started loading %d models from %s', len(bigg_ids), folder)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        models = executor.map(_load_bigg_model_file,
+                              [join(folder, index[x]['file_name']) for x in bigg_ids],
+                              [index[x]['details'] for x in bigg_ids])
+        models = dict(zip(bigg_ids, models))
+    LOGGER.info('Finished loading models from %s', folder)
+    return models
+
+
 def get_bigg_model_list():
     """ Get the list of models available from BiGG website.
 
@@ -176,14 +557,14 @@ def get_bigg_model_list():
     """
 
     LOGGER.info('Started download of model list')
-    response = requests.get(bigg_url + 'models')
+    response = get_transport().get(bigg_url + 'models')
     if response.status_code != requests.codes.OK:
         response.raise_for_status()
     LOGGER.info('Finished download of model list')
     return response.json()['results']
 
 
-def get_bigg_metabolite(bigg_id, model_bigg_id='universal'):
+def get_bigg_metabolite(bigg_id, model_bigg_id='universal', cache=None):
     """ Get a metabolite from the BiGG database.
 
     Parameters
@@ -192,6 +573,8 @@ def get_bigg_metabolite(bigg_id, model_bigg_id='universal'):
         ID of BiGG metabolite
     model_bigg_id : str, optional
         ID of model containing metabolite
+    cache : cobrababel.cache.ResponseCache, optional
+        Cache of responses from BiGG data API
 
     Returns
     -------
@@ -203,12 +586,7 @@ def get_bigg_metabolite(bigg_id, model_bigg_id='universal'):
         url = '{0}universal/metabolites/{1}'.format(bigg_url, bigg_id)
     else:
         url = '{0}models/{1}/metabolites/{2}'.format(bigg_url, model_bigg_id, bigg_id)
-    LOGGER.debug('Started download of %s metabolite from %s model', bigg_id, model_bigg_id)
-    response = requests.get(url)
-    if response.status_code != requests.codes.OK:
-        response.raise_for_status()
-    LOGGER.debug('Finished download of %s metabolite from %s model', bigg_id, model_bigg_id)
-    return response.json()
+    return _get_bigg_details(url, cache)
 
 
 def add_bigg_metabolites(bigg_list, model):
@@ -266,7 +644,7 @@ def add_bigg_metabolites(bigg_list, model):
     return
 
 
-def get_bigg_reaction(bigg_id, model_bigg_id='universal'):
+def get_bigg_reaction(bigg_id, model_bigg_id='universal', cache=None):
     """ Get a reaction from the BiGG database.
 
     Parameters
@@ -275,6 +653,8 @@ def get_bigg_reaction(bigg_id, model_bigg_id='universal'):
         ID of BiGG reaction
     model_bigg_id : str, optional
         ID of model containing reaction
+    cache : cobrababel.cache.ResponseCache, optional
+        Cache of responses from BiGG data API
 
     Returns
     -------
@@ -286,12 +666,7 @@ def get_bigg_reaction(bigg_id, model_bigg_id='universal'):
         url = '{0}universal/reactions/{1}'.format(bigg_url, bigg_id)
     else:
         url = '{0}models/{1}/reactions/{2}'.format(bigg_url, model_bigg_id, bigg_id)
-    LOGGER.debug('Started download of reaction %s from model %s', bigg_id, model_bigg_id)
-    response = requests.get(url)
-    if response.status_code != requests.codes.OK:
-        response.raise_for_status()
-    LOGGER.debug('Finished download of reaction %s from model %s', bigg_id, model_bigg_id)
-    return response.json()
+    return _get_bigg_details(url, cache)
 
 
 def add_bigg_reactions(bigg_list, model, ignore_pseudo_reactions=True):
@@ -334,7 +709,7 @@ def add_bigg_reactions(bigg_list, model, ignore_pseudo_reactions=True):
 
 
 def create_bigg_xref(model, to_namespace, reaction_xref_file_name, metabolite_xref_file_name,
-                     reaction_alias_name=None, metabolite_alias_name=None):
+                     reaction_alias_name=None, metabolite_alias_name=None, index=None):
     """ Create cross reference files using a model created from BiGG.
 
     Parameters
@@ -351,6 +726,8 @@ def create_bigg_xref(model, to_namespace, reaction_xref_file_name, metabolite_xr
         Name of alias for reactions
     metabolite_alias_name : str, optional
         Name of alias for metabolites
+    index : AliasIndex, optional
+        Alias index built from the model
     """
 
     if model.notes['source'] != 'BiGG':
@@ -363,35 +740,46 @@ def create_bigg_xref(model, to_namespace, reaction_xref_file_name, metabolite_xr
     # Build the reaction cross reference from the reaction note for aliases.
     with open(reaction_xref_file_name, 'w') as handle:
         handle.write('bigg\t{0}\n'.format(to_namespace))
-        xref_reactions = model.reactions.query(lambda x: reaction_alias_name in x['aliases'], 'notes')
+        if index is not None:
+            xref_reactions = index.get_objects_with_alias('reaction', reaction_alias_name)
+        else:
+            xref_reactions = [(x.id, [alias['id'] for alias in x.notes['aliases'][reaction_alias_name]])
+                              for x in model.reactions.query(lambda x: reaction_alias_name in x['aliases'], 'notes')]
         if len(xref_reactions) == 0:
             raise ValueError('Model {0} ({1}) does not have any reactions with alias name {2}'
                              .format(model.id, model.name, reaction_alias_name))
-        for reaction in xref_reactions:
-            for alias in reaction.notes['aliases'][reaction_alias_name]:
-                handle.write('{0}\t{1}\n'.format(reaction.id, alias['id']))
+        for reaction_id, aliases in xref_reactions:
+            for alias in aliases:
+                handle.write('{0}\t{1}\n'.format(reaction_id, alias))
 
     # Build the metabolite cross reference from the metabolite note for aliases.
     with open(metabolite_xref_file_name, 'w') as handle:
         handle.write('bigg\t{0}\n'.format(to_namespace))
-        xref_metabolites = model.metabolites.query(lambda x: metabolite_alias_name in x['aliases'], 'notes')
+        if index is not None:
+            xref_metabolites = index.get_objects_with_alias('metabolite', metabolite_alias_name)
+        else:
+            xref_metabolites = [(x.id, [alias['id'] for alias in x.notes['aliases'][metabolite_alias_name]])
+                                for x in model.metabolites.query(lambda x: metabolite_alias_name in x['aliases'],
+                                                                 'notes')]
         if len(xref_metabolites) == 0:
             raise ValueError('Model {0} ({1}) does not have any metabolites with alias name {2}'
                              .format(model.id, model.name, metabolite_alias_name))
-        for metabolite in xref_metabolites:
-            for alias in metabolite.notes['aliases'][metabolite_alias_name]:
-                handle.write('{0}\t{1}\n'.format(metabolite.id, alias['id']))
+        for metabolite_id, aliases in xref_metabolites:
+            for alias in aliases:
+                handle.write('{0}\t{1}\n'.format(metabolite_id, alias))
 
     return
 
 
-def get_bigg_alias_names(model):
+def get_bigg_alias_names(model, index=None):
     """ Get the set of alias names in a model created from BiGG.
 
     Parameters
     ----------
     model : cobra.core.Model
         COBRA model object created from BiGG database
+    index : AliasIndex, optional
+        Alias index built from the model
 
     Returns
     -------
@@ -399,6 +787,8 @@ def get_bigg_alias_names(model):
         Set of alias names from notes attribute in reactions and metabolites
     """
 
+    if index is not None:
+        return index.get_alias_names()
     names = set()
     for rxn in model.reactions:
         try:
@@ -411,3 +801,1013 @@ def get_bigg_alias_names(model):
         except KeyError:
             pass
     return names
+
+
+def create_bigg_xref_files(model, folder, alias_names=None, compress=False):
+    """ Create cross reference files for all alias names using a model created from BiGG.
+
+    The reactions and metabolites in the model are scanned once and the cross
+    reference files for every alias name are written at the same time. The
+    namespace for an alias name is the lowercase alias name with characters
+    that are not letters or digits replaced by "_" (for example, "KEGG Compound"
+    is "kegg_compound"). The reaction cross reference for a namespace is in file
+    "bigg_<namespace>_reaction_xref.tsv" and the metabolite cross reference is in
+    file "bigg_<namespace>_metabolite_xref.tsv". A file is only created when
+    there is at least one reaction or metabolite with the alias name and there
+    is a warning for a requested alias name that is not in the model.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        COBRA model object created from BiGG database
+    folder : str
+        Path to folder for storing cross reference files
+    alias_names : list of str, optional
+        List of alias names to create cross reference files for (default is all alias names)
+    compress : bool, optional
+        When True, compress cross reference files with gzip and add ".gz" to file names
+
+    Returns
+    -------
+    dict
+        Dictionary keyed by alias name of dictionary with number of 'reaction' and
+        'metabolite' cross references
+    """
+
+    if model.notes['source'] != 'BiGG':
+        warn('Model {0} ({1}) is not a BiGG model'.format(model.id, model.name))
+    if not exists(folder):
+        makedirs(folder)
+    selected = set(alias_names) if alias_names is not None else None
+
+    counts = dict()
+    handles = dict()
+    try:
+        for object_type, object_list in [('reaction', model.reactions), ('metabolite', model.metabolites)]:
+            for item in object_list:
+                for alias_name, aliases in iteritems(item.notes.get('aliases', dict())):
+                    if selected is not None and alias_name not in selected:
+                        continue
+
+                    # Open the cross reference file the first time the alias name is found.
+                    key = (alias_name, object_type)
+                    if key not in handles:
+                        namespace = re.sub(r'[^0-9a-z]+', '_', alias_name.lower()).strip('_')
+                        file_name = join(folder, 'bigg_{0}_{1}_xref.tsv'.format(namespace, object_type))
+                        if compress:
+                            handles[key] = open_gzip_text(file_name + '.gz', 'w')
+                        else:
+                            handles[key] = open(file_name, 'w')
+                        handles[key].write('bigg\t{0}\n'.format(namespace))
+                        counts.setdefault(alias_name, {'reaction': 0, 'metabolite': 0})
+                    for alias in aliases:
+                        handles[key].write('{0}\t{1}\n'.format(item.id, alias['id']))
+                    counts[alias_name][object_type] += len(aliases)
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    if selected is not None:
+        for alias_name in sorted(selected - set(counts)):
+            warn('Alias name "{0}" is not available in model {1}'.format(alias_name, model.id))
+    return counts
+
+
+class AliasIndex(object):
+    """ Index of the aliases of the reactions and metabolites in a model.
+
+    The index maps an alias name (for example, "KEGG Compound") and an external
+    ID to the set of reaction or metabolite IDs with that alias and maps a
+    reaction or metabolite ID to its aliases. The index is built from the
+    "aliases" note of each reaction and metabolite. Call update() after editing
+    some objects or rebuild() after editing many objects in the model.
+    """
+
+    def __init__(self, model):
+        """ Initialize object.
+
+        Parameters
+        ----------
+        model : cobra.core.Model
+            COBRA model object with aliases in notes of reactions and metabolites
+        """
+
+        self.model = model
+        self.rebuild()
+        return
+
+    def rebuild(self):
+        """ Build the index from all of the reactions and metabolites in the model. """
+
+        # Dictionary keyed by object type, then alias name, then external ID of set of object IDs.
+        self._by_alias = {'reaction': dict(), 'metabolite': dict()}
+
+        # Dictionary keyed by object type, then object ID, then alias name of tuple of external IDs.
+        self._by_object = {'reaction': dict(), 'metabolite': dict()}
+
+        for rxn in self.model.reactions:
+            self._add('reaction', rxn)
+        for met in self.model.metabolites:
+            self._add('metabolite', met)
+        return
+
+    def update(self, objects):
+        """ Update the index for a list of reactions or metabolites that were added or changed.
+
+        Parameters
+        ----------
+        objects : list of cobra.core.Reaction or cobra.core.Metabolite
+            List of objects to update in the index
+        """
+
+        for item in objects:
+            object_type = self._object_type(item)
+            self._remove(object_type, item.id)
+            self._add(object_type, item)
+        return
+
+    def remove(self, objects):
+        """ Remove a list of reactions or metabolites from the index.
+
+        Parameters
+        ----------
+        objects : list of cobra.core.Reaction or cobra.core.Metabolite
+            List of objects to remove from the index
+        """
+
+        for item in objects:
+            self._remove(self._object_type(item), item.id)
+        return
+
+    def get_alias_names(self):
+        """ Get the set of alias names of all reactions and metabolites.
+
+        Returns
+        -------
+        set
+            Set of alias names
+        """
+
+        return set(self._by_alias['reaction']) | set(self._by_alias['metabolite'])
+
+    def get_reactions(self, alias_name, external_id):
+        """ Get the reactions with an alias.
+
+        Parameters
+        ----------
+        alias_name : str
+            Name of alias (for example, "KEGG Reaction")
+        external_id : str
+            ID in the namespace of the alias
+
+        Returns
+        -------
+        frozenset
+            Set of reaction IDs
+        """
+
+        return frozenset(self._by_alias['reaction'].get(alias_name, dict()).get(external_id, ()))
+
+    def get_metabolites(self, alias_name, external_id):
+        """ Get the metabolites with an alias.
+
+        Parameters
+        ----------
+        alias_name : str
+            Name of alias (for example, "KEGG Compound")
+        external_id : str
+            ID in the namespace of the alias
+
+        Returns
+        -------
+        frozenset
+            Set of metabolite IDs
+        """
+
+        return frozenset(self._by_alias['metabolite'].get(alias_name, dict()).get(external_id, ()))
+
+    def get_aliases(self, object_type, object_id, alias_name=None):
+        """ Get the aliases of a reaction or metabolite.
+
+        Parameters
+        ----------
+        object_type : {'reaction', 'metabolite'}
+            Type of object
+        object_id : str
+            ID of reaction or metabolite
+        alias_name : str, optional
+            Name of alias (default is all alias names)
+
+        Returns
+        -------
+        dict or tuple
+            Dictionary keyed by alias name of tuple of external IDs or tuple of
+            external IDs when an alias name is specified
+        """
+
+        aliases = self._by_object[object_type].get(object_id, dict())
+        if alias_name is not None:
+            return aliases.get(alias_name, tuple())
+        return dict(aliases)
+
+    def get_objects_with_alias(self, object_type, alias_name):
+        """ Get the reactions or metabolites that have an alias name.
+
+        Parameters
+        ----------
+        object_type : {'reaction', 'metabolite'}
+            Type of object
+        alias_name : str
+            Name of alias
+
+        Returns
+        -------
+        list of tuple
+            List of object ID and tuple of external IDs in the order of the objects in the model
+        """
+
+        objects = self.model.reactions if object_type == 'reaction' else self.model.metabolites
+        by_object = self._by_object[object_type]
+        return [(item.id, by_object[item.id][alias_name]) for item in objects
+                if alias_name in by_object.get(item.id, dict())]
+
+    def _add(self, object_type, item):
+        """ Add the aliases of a reaction or metabolite to the index. """
+
+        aliases = dict()
+        for alias_name, value in iteritems(item.notes.get('aliases', dict())):
+            # BiGG aliases are a list of dictionaries and other sources use a string.
+            if isinstance(value, string_types):
+                external_ids = (value,)
+            else:
+                external_ids = tuple(x['id'] if isinstance(x, dict) else x for x in value)
+            aliases[alias_name] = external_ids
+            by_id = self._by_alias[object_type].setdefault(alias_name, dict())
+            for external_id in external_ids:
+                by_id.setdefault(external_id, set()).add(item.id)
+        self._by_object[object_type][item.id] = aliases
+        return
+
+    def _remove(self, object_type, object_id):
+        """ Remove the aliases of a reaction or metabolite from the index. """
+
+        aliases = self._by_object[object_type].pop(object_id, dict())
+        for alias_name, external_ids in iteritems(aliases):
+            by_id = self._by_alias[object_type][alias_name]
+            for external_id in set(external_ids):
+                by_id[external_id].discard(object_id)
+                if len(by_id[external_id]) == 0:
+                    del by_id[external_id]
+            if len(by_id) == 0:
+                del self._by_alias[object_type][alias_name]
+        return
+
+    @staticmethod
+    def _object_type(item):
+        """ Get the object type of a reaction or metabolite. """
+
+        return 'reaction' if isinstance(item, Reaction) else 'metabolite'
+
+
+def _get_bigg_database_version():
+    """ Get the current version of the BiGG database.
+
+    Returns
+    -------
+    dict
+        Dictionary with BiGG database version and last updated date
+    """
+
+    response = get_transport().get(bigg_url + 'database_version')
+    if response.status_code != requests.codes.OK:
+        response.raise_for_status()
+    return response.json()
+
+
+def _get_bigg_universal_list(object_type):
+    """ Get the list of universal objects from the BiGG database.
+
+    Parameters
+    ----------
+    object_type : {'metabolites', 'reactions'}
+        Type of universal BiGG objects
+
+    Returns
+    -------
+    list of dict
+        List of dictionaries with BiGG ID and name of each object
+    """
+
+    LOGGER.info('Started download of universal %s list', object_type)
+    response = get_transport().get('{0}universal/{1}'.format(bigg_url, object_type))
+    if response.status_code != requests.codes.OK:
+        response.raise_for_status()
+    LOGGER.info('Finished download of universal %s list', object_type)
+    return response.json()['results']
+
+
+def _expand_bigg_metabolites(bigg_list):
+    """ Create a metabolite for each compartment of a list of universal BiGG metabolites.
+
+    The metabolite for each compartment only has the fields needed by
+    add_bigg_metabolites() so the full universal metabolite data can be released.
+    One database links dictionary is shared by all of the compartments of a
+    metabolite so replace the aliases of a metabolite instead of changing them
+    in place.
+
+    Parameters
+    ----------
+    bigg_list : list of dict
+        List of dictionaries with universal BiGG metabolite data
+
+    Returns
+    -------
+    list of dict
+        List of dictionaries with BiGG metabolite data for one compartment
+    """
+
+    metabolites = list()
+    for bigg_metabolite in bigg_list:
+        shared = dict((key, bigg_metabolite[key]) for key in metabolite_fields if key in bigg_metabolite)
+        for compartment in set(x['bigg_id'] for x in bigg_metabolite['compartments_in_models']):
+            metabolite = shared.copy()
+            metabolite['compartment_bigg_id'] = compartment
+            metabolites.append(metabolite)
+    return metabolites
+
+
+def _read_bigg_source(file_name):
+    """ Read BiGG universal metabolites and reactions from a local mirror, bulk dump file, or export folder.
+
+    Parameters
+    ----------
+    file_name : str
+        Path to local mirror file, bulk dump file, or folder with BiGG export files
+
+    Returns
+    -------
+    tuple
+        BiGG database version details, list of metabolite data for add_bigg_metabolites(),
+        and list of reaction data for add_bigg_reactions()
+    """
+
+    if isdir(file_name):
+        return read_bigg_export(join(file_name, export_metabolite_file_name),
+                                join(file_name, export_reaction_file_name))
+    with open(file_name, 'rb') as handle:
+        is_mirror = handle.read(16) == b'SQLite format 3\x00'
+    if not is_mirror:
+        return read_bigg_dump(file_name)
+    mirror = _BiggMirror(file_name)
+    try:
+        metabolites = _expand_bigg_metabolites(mirror.objects('metabolite'))
+        reactions = mirror.objects('reaction')
+    finally:
+        mirror.close()
+    return mirror.version, metabolites, reactions
+
+
+def _open_bigg_dump(file_name):
+    """ Open a bulk dump file that is optionally compressed with gzip.
+
+    Parameters
+    ----------
+    file_name : str
+        Path to bulk dump file
+
+    Returns
+    -------
+    file
+        File handle for reading text from the file
+    """
+
+    if file_name.endswith('.gz'):
+        return open_gzip_text(file_name)
+    return open(file_name, 'r')
+
+
+def _read_bigg_export_file(file_name, required_fields):
+    """ Read the lines from a BiGG export file.
+
+    Parameters
+    ----------
+    file_name : str
+        Path to BiGG export file
+    required_fields : list of str
+        List of field names that must be in the header line
+
+    Yields
+    ------
+    tuple
+        Line number and dictionary keyed by field name of fields from each line
+    """
+
+    with _open_bigg_dump(file_name) as handle:
+        header = handle.readline().rstrip('\r\n').split('\t')
+        missing = [name for name in required_fields if name not in header]
+        if len(missing) > 0:
+            raise ValueError('Export file {0} does not have fields {1}'.format(file_name, ', '.join(missing)))
+        for line_number, line in enumerate(handle, start=2):
+            line = line.rstrip('\r\n')
+            if len(line) == 0:
+                continue
+            fields = line.split('\t')
+            if len(fields) < len(header):
+                fields.extend([''] * (len(header) - len(fields)))
+            yield line_number, dict(zip(header, fields))
+
+
+def _parse_bigg_export_links(links):
+    """ Parse the database links field from a BiGG export file.
+
+    Parameters
+    ----------
+    links : str
+        Database links in the format "Namespace: URL; Namespace: URL"
+
+    Returns
+    -------
+    dict
+        Dictionary keyed by namespace of list of links in the same format as BiGG data API
+    """
+
+    database_links = dict()
+    for link in links.split('; '):
+        namespace, separator, url = link.partition(': ')
+        if len(separator) == 0:
+            continue
+        database_links.setdefault(namespace, list()).append({'link': url, 'id': url.rstrip('/').rsplit('/', 1)[-1]})
+    return database_links
+
+
+def _parse_bigg_reaction_string(reaction_string):
+    """ Parse the reaction string from a BiGG export file.
+
+    Parameters
+    ----------
+    reaction_string : str
+        Reaction string, for example "2.0 h_c + nadph_c <-> nadp_c"
+
+    Returns
+    -------
+    tuple
+        List of dictionaries with metabolite data for add_bigg_reactions() and tuple of lower and upper bounds
+    """
+
+    match = re.match(r'^(.*?)\s*(<->|-->|<--)\s*(.*)$', reaction_string)
+    if match is None:
+        raise ValueError('Unknown direction symbol in reaction string "{0}"'.format(reaction_string))
+    bounds = {'<->': (-1000.0, 1000.0), '-->': (0.0, 1000.0), '<--': (-1000.0, 0.0)}[match.group(2)]
+    metabolites = list()
+    for side, sign in [(match.group(1), -1.0), (match.group(3), 1.0)]:
+        for term in side.split(' + '):
+            parts = term.split()
+            if len(parts) == 0:
+                continue
+            if len(parts) > 2:
+                raise ValueError('Invalid term "{0}" in reaction string "{1}"'.format(term, reaction_string))
+            try:
+                coefficient = float(parts[0]) if len(parts) == 2 else 1.0
+            except ValueError:
+                raise ValueError('Invalid coefficient in term "{0}" in reaction string "{1}"'
+                                 .format(term, reaction_string))
+            bigg_id, separator, compartment = parts[-1].rpartition('_')
+            if len(separator) == 0:
+                raise ValueError('Metabolite {0} does not have a compartment'.format(parts[-1]))
+            metabolites.append({'bigg_id': bigg_id, 'compartment_bigg_id': compartment,
+                                'stoichiometry': sign * coefficient})
+    return metabolites, bounds
+
+
+def _set_bigg_model_details(model, details):
+    """ Add the details from BiGG data API to a model and confirm a few basics.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        COBRA model created from JSON representation of BiGG model
+    details : dict
+        Dictionary with BiGG model details
+    """
+
+    model.name = details['organism']
+    model.notes['genome_name'] = details['genome_name']
+    model.notes['reference_type'] = details['reference_type']
+    model.notes['reference_id'] = details['reference_id']
+    model.notes['source'] = 'BiGG'
+
+    if len(model.reactions) != details['reaction_count']:
+        warn('{0} reactions in model does not equal {1} in model details'
+             .format(len(model.reactions), details['reaction_count']))
+    if len(model.metabolites) != details['metabolite_count']:
+        warn('{0} metabolites in model does not equal {1} in model details'
+             .format(len(model.metabolites), details['metabolite_count']))
+    if len(model.genes) != details['gene_count']:
+        warn('{0} genes in model does not equal {1} in model details'
+             .format(len(model.genes), details['gene_count']))
+    return
+
+
+def _read_bigg_repository_index(folder):
+    """ Read the index of a local repository of BiGG models.
+
+    Parameters
+    ----------
+    folder : str
+        Path to repository folder
+
+    Returns
+    -------
+    dict
+        Dictionary keyed by BiGG model ID with details, last updated date, and file name
+    """
+
+    try:
+        with open(join(folder, 'index.json'), 'r') as handle:
+            return json.load(handle)
+    except IOError:
+        return dict()
+
+
+def _write_bigg_repository_index(folder, index):
+    """ Write the index of a local repository of BiGG models.
+
+    Parameters
+    ----------
+    folder : str
+        Path to repository folder
+    index : dict
+        Dictionary keyed by BiGG model ID with details, last updated date, and file name
+    """
+
+    temp_file_name = join(folder, 'index.json.tmp')
+    with open(temp_file_name, 'w') as handle:
+        json.dump(index, handle, indent=1, sort_keys=True)
+    replace_file(temp_file_name, join(folder, 'index.json'))
+    return
+
+
+def _download_bigg_model_file(bigg_id, folder, entry=None):
+    """ Download a BiGG model into a local repository when it has changed.
+
+    Parameters
+    ----------
+    bigg_id : str
+        ID of BiGG model
+    folder : str
+        Path to repository folder
+    entry : dict, optional
+        Index entry for current version of model in repository
+
+    Returns
+    -------
+    dict
+        Index entry for downloaded version of model
+    """
+
+    response = get_transport().get('{0}models/{1}'.format(bigg_url, bigg_id))
+    if response.status_code != requests.codes.OK:
+        response.raise_for_status()
+    details = response.json()
+    last_updated = details.get('last_updated')
+
+    # Skip the download when the model has not changed.
+    if entry is not None and last_updated is not None and entry['last_updated'] == last_updated \
+            and exists(join(folder, entry['file_name'])):
+        LOGGER.info('Skipped download of %s model which has not changed since %s', bigg_id, last_updated)
+        return entry
+
+    # Stream the JSON representation of the model to a file for this version.
+    model_folder = join(folder, bigg_id)
+    if not exists(model_folder):
+        makedirs(model_folder)
+    version = re.sub(r'[^0-9A-Za-z]+', '-', last_updated) if last_updated is not None else 'current'
+    file_name = join(bigg_id, '{0}.json'.format(version))
+    LOGGER.info('Started download of %s model', bigg_id)
+    response = get_transport().get('{0}models/{1}/download'.format(bigg_url, bigg_id), stream=True)
+    if response.status_code != requests.codes.OK:
+        response.raise_for_status()
+    temp_file_name = join(folder, file_name + '.tmp')
+    with open(temp_file_name, 'wb') as handle:
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
+            handle.write(chunk)
+    replace_file(temp_file_name, join(folder, file_name))
+    LOGGER.info('Finished download of %s model', bigg_id)
+
+    return {'last_updated': last_updated, 'file_name': file_name, 'details': details}
+
+
+def _load_bigg_model_file(file_name, details):
+    """ Create a COBRA model from a JSON file in a local repository of BiGG models.
+
+    Parameters
+    ----------
+    file_name : str
+        Path to JSON file with BiGG model
+    details : dict
+        Dictionary with BiGG model details
+
+    Returns
+    -------
+    cobra.core.Model
+        COBRA model created from JSON representation of BiGG model
+    """
+
+    model = load_json_model(file_name)
+    _set_bigg_model_details(model, details)
+    return model
+
+
+def _bigg_response_cache(cache_folder, version):
+    """ Create a cache of responses from BiGG data API for a version of the BiGG database.
+
+    Parameters
+    ----------
+    cache_folder : str or None
+        Path to folder for caching details between runs with the same BiGG database version
+    version : dict
+        BiGG database version details
+
+    Returns
+    -------
+    cobrababel.cache.ResponseCache or None
+        Cache of responses from BiGG data API or None when there is no cache folder
+    """
+
+    if cache_folder is None:
+        return None
+    return ResponseCache(cache_folder, '{0} {1}'.format(version['bigg_models_version'], version['last_updated']))
+
+
+def _get_bigg_details(url, cache=None):
+    """ Get the details for a BiGG object from the cache or from BiGG data API.
+
+    Parameters
+    ----------
+    url : str
+        URL of BiGG data API request
+    cache : cobrababel.cache.ResponseCache, optional
+        Cache of responses from BiGG data API
+
+    Returns
+    -------
+    dict
+        Dictionary with object data
+    """
+
+    if cache is not None:
+        details = cache.get(url)
+        if details is not None:
+            return details
+    LOGGER.debug('Started download of %s', url)
+    response = get_transport().get(url)
+    if response.status_code != requests.codes.OK:
+        response.raise_for_status()
+    LOGGER.debug('Finished download of %s', url)
+    details = response.json()
+    if cache is not None:
+        cache.put(url, details)
+    return details
+
+
+def _download_bigg_objects(get_function, id_list, object_type, workers=1, journal=None):
+    """ Download the details for a list of BiGG objects.
+
+    The rate of requests to BiGG data API is controlled by the rate limiter for
+    the host in the transport so the load stays reasonable no matter how many
+    workers are used.
+
+    Parameters
+    ----------
+    get_function : function
+        Function that gets the details for one BiGG ID
+    id_list : list of str
+        List of BiGG IDs
+    object_type : str
+        Type of BiGG object for log messages
+    workers : int, optional
+        Number of concurrent requests to BiGG data API
+    journal : _BiggJournal, optional
+        Journal for recording details as they are downloaded
+
+    Returns
+    -------
+    list of dict
+        List of dictionaries with object data in the same order as the list of IDs
+    """
+
+    # Only download the details that are not already recorded in the journal.
+    if journal is not None:
+        details = journal.completed(object_type)
+        LOGGER.info('Found %d %ss in journal', len(details), object_type)
+    else:
+        details = dict()
+    download_list = [x for x in id_list if x not in details]
+
+    for bigg_id, result in _fetch_bigg_objects(get_function, download_list, object_type, workers):
+        if journal is not None:
+            journal.record(object_type, bigg_id, result)
+        details[bigg_id] = result
+    return [details[x] for x in id_list]
+
+
+def _fetch_bigg_objects(get_function, id_list, object_type, workers=1):
+    """ Download the details for a list of BiGG objects as they are returned by BiGG data API.
+
+    Parameters
+    ----------
+    get_function : function
+        Function that gets the details for one BiGG ID
+    id_list : list of str
+        List of BiGG IDs
+    object_type : str
+        Type of BiGG object for log messages
+    workers : int, optional
+        Number of concurrent requests to BiGG data API
+
+    Yields
+    ------
+    tuple
+        BiGG ID and dictionary with object data in the same order as the list of IDs
+    """
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for index, result in enumerate(executor.map(get_function, id_list)):
+            if index % PROGRESS_COUNT == 0:
+                LOGGER.info('Downloaded %s number %d of %d', object_type, index, len(id_list))
+            yield id_list[index], result
+
+
+class _BiggJournal(object):
+    """ Journal of details downloaded from BiGG data API.
+
+    The journal file has one JSON record per line. The first record has the
+    BiGG database version and each following record has the details for one
+    metabolite or reaction.
+    """
+
+    def __init__(self, file_name, version, resume=False):
+        """ Initialize object.
+
+        Parameters
+        ----------
+        file_name : str
+            Path to journal file
+        version : dict
+            BiGG database version details
+        resume : bool, optional
+            When True, keep the records in an existing journal file for the same version
+        """
+
+        self.file_name = file_name
+        self.records = {'metabolite': dict(), 'reaction': dict()}
+
+        # Load the records from an existing journal file that is for the same version.
+        if resume:
+            resume = False
+            complete_length = 0
+            try:
+                with open(file_name, 'rb') as handle:
+                    for line in handle:
+                        # A line without a newline was being written when the download was interrupted.
+                        if not line.endswith(b'\n'):
+                            LOGGER.warning('Skipped incomplete record in journal file %s', file_name)
+                            break
+                        complete_length += len(line)
+                        try:
+                            record = json.loads(line.decode('utf-8'))
+                        except ValueError:
+                            LOGGER.warning('Skipped incomplete record in journal file %s', file_name)
+                            continue
+                        if record['type'] == 'version':
+                            if record['data'] != version:
+                                warn('Journal file {0} is for a different BiGG database version and was not used'
+                                     .format(file_name))
+                                break
+                            resume = True
+                        elif resume:
+                            self.records[record['type']][record['bigg_id']] = record['data']
+            except IOError:
+                pass
+            if not resume:
+                self.records = {'metabolite': dict(), 'reaction': dict()}
+
+        # Start a new journal file or continue the existing journal file. Remove an
+        # incomplete last line first so the next record starts on a new line.
+        if resume:
+            with open(file_name, 'r+b') as handle:
+                handle.truncate(complete_length)
+            self.handle = open(file_name, 'a')
+        else:
+            self.handle = open(file_name, 'w')
+            self._write({'type': 'version', 'data': version})
+        return
+
+    def completed(self, object_type):
+        """ Get the details for the objects recorded in the journal.
+
+        Parameters
+        ----------
+        object_type : {'metabolite', 'reaction'}
+            Type of BiGG object
+
+        Returns
+        -------
+        dict
+            Dictionary keyed by BiGG ID of object data
+        """
+
+        return dict(self.records[object_type])
+
+    def record(self, object_type, bigg_id, data):
+        """ Record the details for an object in the journal.
+
+        Parameters
+        ----------
+        object_type : {'metabolite', 'reaction'}
+            Type of BiGG object
+        bigg_id : str
+            ID of BiGG object
+        data : dict
+            Dictionary with object data
+        """
+
+        self._write({'type': object_type, 'bigg_id': bigg_id, 'data': data})
+        return
+
+    def close(self):
+        """ Close the journal file. """
+
+        self.handle.close()
+        return
+
+    def _write(self, record):
+        """ Write a record to the journal file and flush it to disk. """
+
+        self.handle.write(json.dumps(record) + '\n')
+        self.handle.flush()
+        return
+
+
+def _read_bigg_records(handle):
+    """ Read the records from a file with one JSON record per line.
+
+    A line that is not complete, for example when a download was interrupted
+    while writing a record, is skipped.
+
+    Parameters
+    ----------
+    handle : file
+        File handle of file with BiGG records
+
+    Yields
+    ------
+    dict
+        Dictionary with record type, BiGG ID, and data
+    """
+
+    for line in handle:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            LOGGER.warning('Skipped incomplete record in BiGG records file')
+
+
+class _BiggMirror(object):
+    """ Local SQLite mirror of BiGG universal metabolites and reactions.
+
+    Details are recorded in the mirror as they are downloaded and only the
+    IDs of the stored objects are read when refreshing the mirror.
+    """
+
+    # Table name for each type of BiGG object
+    tables = {'metabolite': 'metabolites', 'reaction': 'reactions'}
+
+    def __init__(self, file_name, version=None):
+        """ Initialize object.
+
+        Parameters
+        ----------
+        file_name : str
+            Path to local mirror file
+        version : dict, optional
+            Current BiGG database version details when creating or refreshing the mirror
+        """
+
+        if version is None and not exists(file_name):
+            raise IOError('BiGG mirror file {0} does not exist'.format(file_name))
+        self.file_name = file_name
+        self.pending = 0
+        self.connection = sqlite3.connect(file_name)
+
+        # When reading a mirror, confirm the file is a mirror without changing it.
+        if version is None:
+            cursor = self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            names = set(name for name, in cursor)
+            row = None
+            if names.issuperset(['info'] + list(self.tables.values())):
+                row = self.connection.execute('SELECT value FROM info WHERE name = ?', ('version',)).fetchone()
+            if row is None:
+                self.connection.close()
+                raise ValueError('File {0} is not a BiGG mirror'.format(file_name))
+            self.version = json.loads(row[0])
+            return
+
+        self.connection.execute('CREATE TABLE IF NOT EXISTS info (name TEXT PRIMARY KEY, value TEXT)')
+        for table in self.tables.values():
+            self.connection.execute('CREATE TABLE IF NOT EXISTS {0} (bigg_id TEXT PRIMARY KEY, data TEXT)'
+                                    .format(table))
+        row = self.connection.execute('SELECT value FROM info WHERE name = ?', ('version',)).fetchone()
+
+        # Start over when the mirror is for a different version of the BiGG database.
+        if row is None or json.loads(row[0]) != version:
+            for table in self.tables.values():
+                self.connection.execute('DELETE FROM {0}'.format(table))
+            self.connection.execute('INSERT OR REPLACE INTO info VALUES (?, ?)', ('version', json.dumps(version)))
+        self.version = version
+        self.connection.commit()
+        return
+
+    def stored_ids(self, object_type):
+        """ Get the IDs of the objects in the mirror without reading their details.
+
+        Parameters
+        ----------
+        object_type : {'metabolite', 'reaction'}
+            Type of BiGG object
+
+        Returns
+        -------
+        set of str
+            Set of BiGG IDs
+        """
+
+        cursor = self.connection.execute('SELECT bigg_id FROM {0}'.format(self.tables[object_type]))
+        return set(bigg_id for bigg_id, in cursor)
+
+    def objects(self, object_type):
+        """ Get the details for the objects in the mirror sorted by BiGG ID.
+
+        Parameters
+        ----------
+        object_type : {'metabolite', 'reaction'}
+            Type of BiGG object
+
+        Returns
+        -------
+        list of dict
+            List of dictionaries with object data
+        """
+
+        cursor = self.connection.execute('SELECT data FROM {0} ORDER BY bigg_id'.format(self.tables[object_type]))
+        return [json.loads(data) for data, in cursor]
+
+    def record(self, object_type, bigg_id, data):
+        """ Store the details for an object in the mirror.
+
+        Parameters
+        ----------
+        object_type : {'metabolite', 'reaction'}
+            Type of BiGG object
+        bigg_id : str
+            ID of BiGG object
+        data : dict
+            Dictionary with object data
+        """
+
+        self.connection.execute('INSERT OR REPLACE INTO {0} VALUES (?, ?)'.format(self.tables[object_type]),
+                                (bigg_id, json.dumps(data)))
+
+        # Committing every record is slow so commit in batches. The last batch is committed on close.
+        self.pending += 1
+        if self.pending >= MIRROR_COMMIT_COUNT:
+            self.connection.commit()
+            self.pending = 0
+        return
+
+    def retain(self, object_type, id_list):
+        """ Remove the objects that are not in a list of BiGG IDs from the mirror.
+
+        Parameters
+        ----------
+        object_type : {'metabolite', 'reaction'}
+            Type of BiGG object
+        id_list : list of str
+            List of BiGG IDs to keep
+        """
+
+        keep = set(id_list)
+        table = self.tables[object_type]
+        remove_list = [(bigg_id,) for bigg_id, in self.connection.execute('SELECT bigg_id FROM {0}'.format(table))
+                       if bigg_id not in keep]
+        self.connection.executemany('DELETE FROM {0} WHERE bigg_id = ?'.format(table), remove_list)
+        self.connection.commit()
+        self.pending = 0
+        return
+
+    def close(self):
+        """ Commit the pending records and close the mirror file. """
+
+        self.connection.commit()
+        self.connection.close()
+        return
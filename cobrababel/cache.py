@@ -0,0 +1,167 @@
+from os import listdir, makedirs, unlink, utime
+from os.path import join, exists, getmtime, getsize
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+import json
+import logging
+
+from .util import replace_file
+
+# Default maximum size in bytes of the files in a cache folder
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+# Name of file with the version of the source system data in a cache folder
+VERSION_FILE_NAME = 'VERSION'
+
+# Logger for this module
+LOGGER = logging.getLogger(__name__)
+
+
+class ResponseCache(object):
+    """ On-disk cache of JSON responses from a source system.
+
+    Each response is stored in a file named by the hash of its key. The cache
+    is tied to a version of the source system data and is cleared when the
+    version changes. When the total size of the files is larger than the maximum
+    size, the least recently used responses are removed.
+    """
+
+    def __init__(self, folder, version, max_size=DEFAULT_MAX_SIZE):
+        """ Initialize object.
+
+        Parameters
+        ----------
+        folder : str
+            Path to folder for storing cached responses
+        version : str
+            Version of source system data
+        max_size : int, optional
+            Maximum size in bytes of the files in the cache folder
+        """
+
+        self.folder = folder
+        self.version = version
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()  # File name to size, least recently used first
+        self._lock = Lock()
+
+        if not exists(folder):
+            makedirs(folder)
+
+        # Clear the cache when the cached responses are from a different version.
+        version_file_name = join(folder, VERSION_FILE_NAME)
+        current_version = None
+        if exists(version_file_name):
+            with open(version_file_name, 'r') as handle:
+                current_version = handle.read()
+        if current_version != version:
+            if current_version is not None:
+                LOGGER.info('Cleared cache in %s for version %s', folder, current_version)
+            self._remove_files(self._cache_files())
+            with open(version_file_name, 'w') as handle:
+                handle.write(version)
+
+        # Load the existing entries in order of last use.
+        for file_name in sorted(self._cache_files(), key=lambda x: getmtime(join(folder, x))):
+            size = getsize(join(folder, file_name))
+            self._entries[file_name] = size
+            self.size += size
+        return
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """ Get a response from the cache.
+
+        Parameters
+        ----------
+        key : str
+            Key of response (typically the request URL)
+
+        Returns
+        -------
+        dict or None
+            Response data or None if the key is not in the cache
+        """
+
+        file_name = self._file_name(key)
+        with self._lock:
+            if file_name not in self._entries:
+                return None
+            self._entries[file_name] = self._entries.pop(file_name)
+        path = join(self.folder, file_name)
+        try:
+            with open(path, 'r') as handle:
+                value = json.load(handle)
+            utime(path, None)
+        except (IOError, OSError, ValueError):
+            LOGGER.warning('Cached response for %s is not available', key)
+            with self._lock:
+                self.size -= self._entries.pop(file_name, 0)
+            return None
+        return value
+
+    def put(self, key, value):
+        """ Store a response in the cache.
+
+        Parameters
+        ----------
+        key : str
+            Key of response (typically the request URL)
+        value : dict
+            Response data
+        """
+
+        file_name = self._file_name(key)
+        path = join(self.folder, file_name)
+        temp_path = '{0}.{1}.tmp'.format(path, id(value))
+        with open(temp_path, 'w') as handle:
+            json.dump(value, handle)
+        size = getsize(temp_path)
+        replace_file(temp_path, path)
+
+        # Remove least recently used responses until the cache fits.
+        with self._lock:
+            self.size += size - self._entries.pop(file_name, 0)
+            self._entries[file_name] = size
+            remove_list = list()
+            while self.size > self.max_size and len(self._entries) > 1:
+                old_file_name, old_size = self._entries.popitem(last=False)
+                self.size -= old_size
+                remove_list.append(old_file_name)
+        self._remove_files(remove_list)
+        return
+
+    def clear(self):
+        """ Remove all of the responses from the cache. """
+
+        with self._lock:
+            remove_list = list(self._entries)
+            self._entries.clear()
+            self.size = 0
+        self._remove_files(remove_list)
+        return
+
+    def _cache_files(self):
+        """ Get the list of response file names in the cache folder. """
+
+        return [x for x in listdir(self.folder) if x.endswith('.json')]
+
+    def _remove_files(self, file_list):
+        """ Remove a list of response files from the cache folder. """
+
+        for file_name in file_list:
+            try:
+                unlink(join(self.folder, file_name))
+            except OSError:
+                pass
+        return
+
+    @staticmethod
+    def _file_name(key):
+        """ Get the file name for a key. """
+
+        return hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json'
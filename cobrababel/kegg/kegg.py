@@ -3,6 +3,7 @@ from warnings import warn
 
 from .KeggReaction import KeggReaction
 from .KeggEnzyme import KeggEnzyme
+from ..transport import get_transport
 
 # Base URL for KEGG website
 kegg_url = 'http://rest.kegg.jp/'
@@ -30,7 +31,7 @@ def _kegg_request(url, result):
     """
 
     # Send the request and receive the response from the web service.
-    response = requests.get(url)
+    response = get_transport().get(url)
     if response.status_code != requests.codes.OK:
         response.raise_for_status()
 
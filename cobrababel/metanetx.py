@@ -2,9 +2,26 @@ import requests
 from warnings import warn
 import re
 import logging
+import gzip
+import json
+import sqlite3
+from os import unlink, makedirs, getpid
+from os.path import exists, join
+from shutil import rmtree
+from tempfile import mkdtemp
+from collections import deque, OrderedDict
+from array import array
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import cpu_count
+from threading import Lock, Event
+from itertools import islice
+import numpy as np
 
 from cobra import Model, Metabolite, Reaction, DictList
 
+from .transport import get_transport
+from .util import open_gzip_text, replace_file
+
 # Base URL for MetaNetX website
 metanetx_url = 'http://www.metanetx.org/cgi-bin/mnxget/mnxref/'
 
@@ -12,18 +29,94 @@ metanetx_url = 'http://www.metanetx.org/cgi-bin/mnxget/mnxref/'
 metanetx_version = 'MNXref Version 2017/05/04'
 
 # Regular expression for metabolites in reaction equation
-metabolite_re = re.compile(r'(\d*\.\d+|\d+) (MNXM\d+|BIOMASS)@(MNXD[\dX]|BOUNDARY)')
+metabolite_pattern = r'(\d*\.\d+|\d+) (MNXM\d+|BIOMASS)@(MNXD[\dX]|BOUNDARY)'
+metabolite_re = re.compile(metabolite_pattern)
+
+# Size in bytes of chunks read from a download
+CHUNK_SIZE = 1024 * 1024
+
+# Compression level for MetaNetX files in a cache folder (faster than the default with about the same size)
+CACHE_COMPRESS_LEVEL = 6
+
+# Maximum number of parsed half equations (reactants or products) kept in the cache
+HALF_EQUATION_CACHE_SIZE = 65536
+
+# Separator between metabolite terms in reactants or products of reaction equation
+TERM_SEPARATOR = ' + '
+
+# Cache of parsed half equations keyed by half equation string in least recently used order and the cache statistics
+_half_equation_cache = OrderedDict()
+_half_equation_stats = {'hits': 0, 'misses': 0}
+
+# Number of reaction equations sent to a worker process at one time
+EQUATION_CHUNK_SIZE = 5000
+
+# Map field names to column numbers in metabolite file (MetaNetX may add fields in future)
+METABOLITE_FIELD_NAMES = {
+    'MNX_ID': 0,
+    'Description': 1,
+    'Formula': 2,
+    'Charge': 3,
+    'Mass': 4,
+    'InChI': 5,
+    'SMILES': 6,
+    'Source': 7,
+    'InChIKey': 8
+}
+
+# Map field names to column numbers in reaction file (hopefully MetaNetX doesn't change this)
+REACTION_FIELD_NAMES = {
+    'MNX_ID': 0,
+    'Equation': 1,
+    'Description': 2,
+    'Balance': 3,
+    'EC': 4,
+    'Source': 5
+}
+
+# Map field names to column numbers in cross reference files (hopefully MetaNetX doesn't change this)
+XREF_FIELD_NAMES = {
+    'XREF': 0,
+    'MNX_ID': 1,
+    'Evidence': 2,
+    'Description': 3
+}
+
+# Version of the layout of the files in a snapshot folder
+SNAPSHOT_FORMAT = 2
+
+# Name of file with the metadata in a snapshot folder (written last when saving a snapshot)
+SNAPSHOT_METADATA_FILE_NAME = 'metadata.json'
+
+# Value stored in a snapshot for a metabolite without a charge
+MISSING_CHARGE = np.iinfo(np.int32).min
+
+# Names of bulky metabolite notes that can be stored in an annotation file instead of in the notes
+ANNOTATION_NOTES = ['InChI', 'SMILES', 'source', 'InChIKey']
+
+# Number of metabolites written to an annotation file at one time
+ANNOTATION_BATCH_SIZE = 10000
+
+# Names of metabolite notes stored as string tables in a snapshot
+SNAPSHOT_METABOLITE_NOTES = ANNOTATION_NOTES
 
 # Logger for this module
 LOGGER = logging.getLogger(__name__)
 
 
-def create_metanetx_universal_model(validate=False, verbose=False):
+def create_metanetx_universal_model(validate=False, verbose=False, cache_folder=None, revalidate=False,
+                                    processes=1, workers=1, compartments=None, source_namespaces=None,
+                                    balanced_only=False, ec_prefixes=None, annotation_file=None):
     """ Create an universal model from MetaNetX universal reactions and metabolites.
 
     The MetaNetX metabolite list is very large and includes metabolites that are
     not used in any reaction. The returned model only includes metabolites that
-    are actually used in a reaction.
+    are actually used in a reaction. The reaction equations are parsed first so
+    Metabolite objects are only created for the metabolites used in a reaction.
+
+    The filters select a slice of the universal reactions. They are applied to
+    the lines in the reactions file as it is read so no objects are created for
+    the reactions that are skipped.
 
     Parameters
     ----------
@@ -31,6 +124,25 @@ def create_metanetx_universal_model(validate=False, verbose=False):
         When True, perform validity checks on universal COBRA model
     verbose : bool, optional
         When True, show warning messages
+    cache_folder : str, optional
+        Path to folder for caching MetaNetX files
+    revalidate : bool, optional
+        When True, check if cached MetaNetX files are current with a conditional request
+    processes : int, optional
+        Number of worker processes for parsing reaction equations (None for number of CPUs)
+    workers : int, optional
+        Number of MetaNetX files downloaded at the same time
+    compartments : list of str, optional
+        When specified, only include reactions with all metabolites in these compartments (e.g. MNXD1)
+    source_namespaces : list of str, optional
+        When specified, only include reactions with a source from these namespaces (e.g. bigg, kegg)
+    balanced_only : bool, optional
+        When True, only include reactions that MetaNetX marks as balanced
+    ec_prefixes : list of str, optional
+        When specified, only include reactions with an EC number starting with one of these prefixes (e.g. 2.7.1)
+    annotation_file : str, optional
+        Path to SQLite file for storing the InChI, SMILES, InChIKey, and source of the
+        metabolites instead of storing them in the notes (use MetaNetXAnnotations to get them)
 
     Returns
     -------
@@ -42,34 +154,947 @@ def create_metanetx_universal_model(validate=False, verbose=False):
     universal = Model('metanetx_universal', name='MetaNetX universal model')
     universal.notes['source'] = 'MetaNetX'
 
-    # Download the metabolites file.
-    metabolite_list = _download_metanetx_file('chem_prop.tsv')
+    # Read the MetaNetX files, starting with the reactions so that only the metabolites
+    # used in a reaction are created. Other files continue to download while a file
+    # is parsed when there is more than one worker. The annotation file is opened
+    # before the downloads start so an annotation file that cannot be opened does
+    # not leave downloads running.
+    annotations = _MetaNetXAnnotationWriter(annotation_file) if annotation_file is not None else None
+    completed = False
+    try:
+        files = _MetaNetXFiles(['reac_prop.tsv', 'comp_prop.tsv', 'chem_prop.tsv'], cache_folder, revalidate, workers)
+        try:
+            reaction_list = _filter_metanetx_reactions(files.read('reac_prop.tsv'), source_namespaces, balanced_only,
+                                                       ec_prefixes)
+            reaction_rows, used_ids = _read_metanetx_reactions(reaction_list, verbose, processes, compartments)
+            all_compartments = _read_metanetx_compartments(files.read('comp_prop.tsv'), verbose)
+            all_metabolites = _read_metanetx_metabolites(files.read('chem_prop.tsv'), used_ids, verbose,
+                                                         annotations)
+            completed = True
+        finally:
+            files.close()
+    finally:
+        if annotations is not None and not completed:
+            annotations.abort()
+    if annotations is not None:
+        annotations.close()
+        universal.notes['annotation_file'] = annotation_file
 
-    # Map field names to column numbers (MetaNetX may add fields in future).
-    field_names = {
-        'MNX_ID': 0,
-        'Description': 1,
-        'Formula': 2,
-        'Charge': 3,
-        'Mass': 4,
-        'InChI': 5,
-        'SMILES': 6,
-        'Source': 7,
-        'InChIKey': 8
+    # Add the compartments to the universal model.
+    for compartment_id in all_compartments:
+        if compartments is None or compartment_id in compartments:
+            universal.compartments[compartment_id] = all_compartments[compartment_id]
+    LOGGER.info('Finished adding {0} compartments to universal model'.format(len(universal.compartments)))
+
+    # Add the reactions to the universal model.
+    universal.add_reactions(_create_metanetx_reactions(reaction_rows, all_metabolites, verbose))
+    LOGGER.info('Finished adding Reaction objects to universal model')
+
+    # If requested, validate the COBRA model.
+    if validate:
+        warn('Coming soon')
+
+    return universal
+
+
+def create_metanetx_metabolite_xref(to_namespace, file_name, cache_folder=None, revalidate=False):
+    """ Create a CobraBabel metabolite cross reference file for MetaNetX and specified namespace.
+
+    Parameters
+    ----------
+    to_namespace : {'bigg', 'cco', 'chebi', 'envipath', 'go', 'hmdb', 'kegg', 'lipidmaps',
+                    'metacyc', 'reactome', 'rhea', 'sabiork', 'seed', 'slm'}
+        Namespace to cross reference to
+    file_name : str
+        Path to file for storing CobraBabel cross reference
+    cache_folder : str, optional
+        Path to folder for caching MetaNetX files
+    revalidate : bool, optional
+        When True, check if the cached MetaNetX file is current with a conditional request
+    """
+
+    _process_metanetx_xref(_download_metanetx_file('chem_xref.tsv', cache_folder, revalidate), to_namespace,
+                           file_name)
+    return
+
+
+def create_metanetx_reaction_xref(to_namespace, file_name, cache_folder=None, revalidate=False):
+    """ Create a CobraBabel reaction cross reference file for MetaNetX and specified namespace.
+
+    Parameters
+    ----------
+    to_namespace : {'bigg', 'cco', 'chebi', 'envipath', 'go', 'hmdb', 'kegg', 'lipidmaps',
+                    'metacyc', 'reactome', 'rhea', 'sabiork', 'seed', 'slm'}
+        Namespace to cross reference to
+    file_name : str
+        Path to file for storing CobraBabel cross reference
+    cache_folder : str, optional
+        Path to folder for caching MetaNetX files
+    revalidate : bool, optional
+        When True, check if the cached MetaNetX file is current with a conditional request
+    """
+
+    _process_metanetx_xref(_download_metanetx_file('reac_xref.tsv', cache_folder, revalidate), to_namespace,
+                           file_name)
+    return
+
+
+def create_metanetx_xref_files(folder, namespaces=None, cache_folder=None, revalidate=False, compress=False):
+    """ Create CobraBabel cross reference files for MetaNetX and all namespaces.
+
+    The metabolite and reaction cross reference files from MetaNetX are each read
+    once and the cross reference files for every namespace are written at the
+    same time. The metabolite cross reference for a namespace is in file
+    "metanetx_<namespace>_metabolite_xref.tsv" and the reaction cross reference
+    is in file "metanetx_<namespace>_reaction_xref.tsv". A file is only created
+    when there is at least one cross reference for the namespace.
+
+    Parameters
+    ----------
+    folder : str
+        Path to folder for storing cross reference files
+    namespaces : list of str, optional
+        List of namespaces to create cross reference files for (default is all namespaces)
+    cache_folder : str, optional
+        Path to folder for caching MetaNetX files
+    revalidate : bool, optional
+        When True, check if the cached MetaNetX files are current with a conditional request
+    compress : bool, optional
+        When True, compress cross reference files with gzip and add ".gz" to file names
+
+    Returns
+    -------
+    dict
+        Dictionary keyed by namespace of dictionary with number of 'reaction' and
+        'metabolite' cross references
+    """
+
+    if not exists(folder):
+        makedirs(folder)
+    selected = set(namespaces) if namespaces is not None else None
+
+    field_names = XREF_FIELD_NAMES
+
+    counts = dict()
+    for object_type, xref_file_name in [('metabolite', 'chem_xref.tsv'), ('reaction', 'reac_xref.tsv')]:
+        handles = dict()
+        try:
+            for fields in _download_metanetx_file(xref_file_name, cache_folder, revalidate):
+                if len(fields) < 2:
+                    continue
+                parts = fields[field_names['XREF']].split(':', 1)
+                if len(parts) != 2 or (selected is not None and parts[0] not in selected):
+                    continue
+
+                # Open the cross reference file the first time the namespace is found.
+                namespace = parts[0]
+                if namespace not in handles:
+                    file_name = join(folder, 'metanetx_{0}_{1}_xref.tsv'.format(namespace, object_type))
+                    if compress:
+                        handles[namespace] = open_gzip_text(file_name + '.gz', 'w')
+                    else:
+                        handles[namespace] = open(file_name, 'w')
+                    handles[namespace].write('metanetx\t{0}\n'.format(namespace))
+                    counts.setdefault(namespace, {'reaction': 0, 'metabolite': 0})
+                handles[namespace].write('{0}\t{1}\n'.format(fields[field_names['MNX_ID']], parts[1]))
+                counts[namespace][object_type] += 1
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+    if selected is not None:
+        for namespace in sorted(selected - set(counts)):
+            warn('Namespace "{0}" is not available in cross reference files'.format(namespace))
+    return counts
+
+
+class MetaNetXXref(object):
+    """ Index of the cross references from MetaNetX to other namespaces.
+
+    The cross reference file for metabolites or reactions is read once and kept
+    in compact arrays where the namespaces, MetaNetX IDs, and evidence values
+    are stored as integer codes and the cross references and descriptions are
+    stored as UTF-8 bytes with an array of offsets. The index maps an external
+    ID (for example, "kegg" and "C00031") to MetaNetX IDs with a hash table of
+    rows in the bytes and maps a MetaNetX ID to its external IDs in a namespace.
+    The evidence and description of each cross reference are kept for filtering.
+    The index can be pickled to share it with worker processes.
+    """
+
+    def __init__(self, object_type='metabolite', cache_folder=None, revalidate=False):
+        """ Initialize object.
+
+        Parameters
+        ----------
+        object_type : {'metabolite', 'reaction'}
+            Type of object to cross reference
+        cache_folder : str, optional
+            Path to folder for caching MetaNetX files
+        revalidate : bool, optional
+            When True, check if the cached MetaNetX file is current with a conditional request
+        """
+
+        if object_type == 'metabolite':
+            xref_file_name = 'chem_xref.tsv'
+        elif object_type == 'reaction':
+            xref_file_name = 'reac_xref.tsv'
+        else:
+            raise ValueError('Object type "{0}" is not supported'.format(object_type))
+        self.object_type = object_type
+
+        field_names = XREF_FIELD_NAMES
+
+        # Read the cross references and convert repeated values to integer codes.
+        self.namespaces = list()
+        self.mnx_ids = list()
+        self.evidence_values = list()
+        codes = [dict(), dict(), dict()]
+        xrefs = list()
+        columns = [list(), list(), list()]
+        descriptions = list()
+        LOGGER.info('Started reading cross references from %s file', xref_file_name)
+        for fields in _download_metanetx_file(xref_file_name, cache_folder, revalidate):
+            if len(fields) < 2 or ':' not in fields[field_names['XREF']]:
+                continue
+            fields.extend([''] * (len(field_names) - len(fields)))
+            values = [fields[field_names['XREF']].split(':', 1)[0], fields[field_names['MNX_ID']],
+                      fields[field_names['Evidence']]]
+            for value, value_list, value_codes, column in \
+                    zip(values, [self.namespaces, self.mnx_ids, self.evidence_values], codes, columns):
+                if value not in value_codes:
+                    value_codes[value] = len(value_list)
+                    value_list.append(value)
+                column.append(value_codes[value])
+            xrefs.append(fields[field_names['XREF']])
+            descriptions.append(fields[field_names['Description']])
+
+        # Sort the cross references so all of the MetaNetX IDs for an external ID are together.
+        order = sorted(range(len(xrefs)), key=xrefs.__getitem__)
+        self.xrefs = _create_string_table([xrefs[x] for x in order])
+        self.descriptions = _create_string_table([descriptions[x] for x in order])
+        self.namespace_codes = np.array(columns[0], dtype=np.int32)[order]
+        self.mnx_codes = np.array(columns[1], dtype=np.int32)[order]
+        self.evidence_codes = np.array(columns[2], dtype=np.int32)[order]
+        self._build_lookups()
+        LOGGER.info('Finished reading %d cross references for %d MetaNetX IDs', len(self.xrefs), len(self.mnx_ids))
+        return
+
+    def __len__(self):
+        return len(self.xrefs)
+
+    def __getstate__(self):
+        # The lookup dictionaries and hash table are rebuilt from the arrays when the object is unpickled.
+        state = self.__dict__.copy()
+        for name in ['_mnx_index', '_namespace_index', '_evidence_index', '_reverse_order', '_reverse_indptr',
+                     '_xref_table', '_xref_ends']:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_lookups()
+        return
+
+    def get_namespaces(self):
+        """ Get the set of namespaces with cross references.
+
+        Returns
+        -------
+        set
+            Set of namespaces
+        """
+
+        return set(self.namespaces)
+
+    def get_mnx_ids(self, namespace, external_id, evidence=None):
+        """ Get the MetaNetX IDs cross referenced to an external ID.
+
+        Parameters
+        ----------
+        namespace : str
+            Namespace of external ID (for example, "kegg")
+        external_id : str
+            ID in the namespace
+        evidence : list of str, optional
+            When specified, only include cross references with these evidence values (e.g. identity)
+
+        Returns
+        -------
+        list of str
+            List of MetaNetX IDs
+        """
+
+        return [self.mnx_ids[self.mnx_codes[row]] for row in self._xref_rows(namespace, external_id, evidence)]
+
+    def get_external_ids(self, mnx_id, namespace, evidence=None):
+        """ Get the external IDs in a namespace cross referenced to a MetaNetX ID.
+
+        Parameters
+        ----------
+        mnx_id : str
+            MetaNetX ID
+        namespace : str
+            Namespace of external IDs (for example, "kegg")
+        evidence : list of str, optional
+            When specified, only include cross references with these evidence values (e.g. identity)
+
+        Returns
+        -------
+        list of str
+            List of external IDs
+        """
+
+        prefix = len(namespace) + 1
+        return [self.xrefs[row][prefix:] for row in self._mnx_rows(mnx_id, namespace, evidence)]
+
+    def get_mnx_id_map(self, namespace, external_ids, evidence=None):
+        """ Get the MetaNetX IDs cross referenced to a list of external IDs.
+
+        Parameters
+        ----------
+        namespace : str
+            Namespace of external IDs (for example, "kegg")
+        external_ids : list of str
+            List of IDs in the namespace
+        evidence : list of str, optional
+            When specified, only include cross references with these evidence values (e.g. identity)
+
+        Returns
+        -------
+        dict
+            Dictionary keyed by external ID of list of MetaNetX IDs (external IDs without
+            a cross reference are not included)
+        """
+
+        id_map = dict()
+        for external_id in external_ids:
+            mnx_ids = self.get_mnx_ids(namespace, external_id, evidence)
+            if len(mnx_ids) > 0:
+                id_map[external_id] = mnx_ids
+        return id_map
+
+    def get_external_id_map(self, mnx_ids, namespace, evidence=None):
+        """ Get the external IDs in a namespace cross referenced to a list of MetaNetX IDs.
+
+        Parameters
+        ----------
+        mnx_ids : list of str
+            List of MetaNetX IDs
+        namespace : str
+            Namespace of external IDs (for example, "kegg")
+        evidence : list of str, optional
+            When specified, only include cross references with these evidence values (e.g. identity)
+
+        Returns
+        -------
+        dict
+            Dictionary keyed by MetaNetX ID of list of external IDs (MetaNetX IDs without
+            a cross reference are not included)
+        """
+
+        id_map = dict()
+        for mnx_id in mnx_ids:
+            external_ids = self.get_external_ids(mnx_id, namespace, evidence)
+            if len(external_ids) > 0:
+                id_map[mnx_id] = external_ids
+        return id_map
+
+    def get_details(self, namespace, external_id):
+        """ Get the details of the cross references for an external ID.
+
+        Parameters
+        ----------
+        namespace : str
+            Namespace of external ID (for example, "kegg")
+        external_id : str
+            ID in the namespace
+
+        Returns
+        -------
+        list of dict
+            List of dictionaries with 'mnx_id', 'evidence', and 'description' keys
+        """
+
+        return [{'mnx_id': self.mnx_ids[self.mnx_codes[row]],
+                 'evidence': self.evidence_values[self.evidence_codes[row]],
+                 'description': self.descriptions[row]}
+                for row in self._xref_rows(namespace, external_id)]
+
+    def _build_lookups(self):
+        """ Build the lookup dictionaries, hash table, and reverse index from the arrays. """
+
+        self._mnx_index = dict((mnx_id, code) for code, mnx_id in enumerate(self.mnx_ids))
+        self._namespace_index = dict((namespace, code) for code, namespace in enumerate(self.namespaces))
+        self._evidence_index = dict((value, code) for code, value in enumerate(self.evidence_values))
+
+        # Rows grouped by MetaNetX ID code in compressed sparse row arrays.
+        self._reverse_order = np.argsort(self.mnx_codes, kind='mergesort').astype(np.int32)
+        self._reverse_indptr = np.zeros(len(self.mnx_ids) + 1, dtype=np.int64)
+        self._reverse_indptr[1:] = np.cumsum(np.bincount(self.mnx_codes, minlength=len(self.mnx_ids)))
+
+        # Open addressing hash table with the first and last rows of each external ID. The table
+        # only has row numbers and the bytes of the cross reference are compared when searching.
+        # String hashes can be different in every process so the table is not pickled.
+        size = 8
+        while size < 2 * len(self.xrefs):
+            size *= 2
+        self._xref_table = array('i', [-1]) * size
+        self._xref_ends = array('i', [0]) * size
+        mask = size - 1
+        slot = -1
+        previous = None
+        for row in range(len(self.xrefs)):
+            xref = self.xrefs.get_bytes(row)
+            if xref != previous:
+                slot = hash(xref) & mask
+                while self._xref_table[slot] >= 0:
+                    slot = (slot + 1) & mask
+                self._xref_table[slot] = row
+                previous = xref
+            self._xref_ends[slot] = row + 1
+        return
+
+    def _evidence_filter(self, evidence):
+        """ Get the set of evidence codes for a list of evidence values. """
+
+        if evidence is None:
+            return None
+        return set(self._evidence_index[x] for x in evidence if x in self._evidence_index)
+
+    def _xref_rows(self, namespace, external_id, evidence=None):
+        """ Get the rows for an external ID. """
+
+        xref = _encode_string(u'{0}:{1}'.format(namespace, external_id))
+        table = self._xref_table
+        mask = len(table) - 1
+        slot = hash(xref) & mask
+        row = table[slot]
+        while row >= 0 and self.xrefs.get_bytes(row) != xref:
+            slot = (slot + 1) & mask
+            row = table[slot]
+        if row < 0:
+            return []
+        rows = range(row, self._xref_ends[slot])
+        evidence_codes = self._evidence_filter(evidence)
+        if evidence_codes is None:
+            return list(rows)
+        return [row for row in rows if self.evidence_codes[row] in evidence_codes]
+
+    def _mnx_rows(self, mnx_id, namespace, evidence=None):
+        """ Get the rows for a MetaNetX ID in a namespace. """
+
+        code = self._mnx_index.get(mnx_id)
+        namespace_code = self._namespace_index.get(namespace)
+        if code is None or namespace_code is None:
+            return []
+        evidence_codes = self._evidence_filter(evidence)
+        rows = self._reverse_order[self._reverse_indptr[code]:self._reverse_indptr[code + 1]]
+        return [row for row in rows.tolist() if self.namespace_codes[row] == namespace_code and
+                (evidence_codes is None or self.evidence_codes[row] in evidence_codes)]
+
+
+class MetaNetXAnnotations(object):
+    """ Accessor for the bulky metabolite notes stored in an annotation file.
+
+    When a universal model is created with an annotation file, the InChI, SMILES,
+    InChIKey, and source of the metabolites are stored in a SQLite file instead
+    of in the notes and the path to the file is in the "annotation_file" note of
+    the model. The file is opened when the first annotation is requested and is
+    opened again in a new process so the object can be shared with worker processes.
+    """
+
+    def __init__(self, file_name):
+        """ Initialize object.
+
+        Parameters
+        ----------
+        file_name : str
+            Path to annotation file (for example, from "annotation_file" note of universal model)
+        """
+
+        if not exists(file_name):
+            raise IOError('Annotation file {0} does not exist'.format(file_name))
+        self.file_name = file_name
+        self._connection = None
+        self._pid = None
+        self._lock = Lock()
+        return
+
+    def __len__(self):
+        return self._query('SELECT COUNT(*) FROM annotations')[0][0]
+
+    def __getstate__(self):
+        # A connection cannot be shared between processes so only the file name is pickled.
+        return {'file_name': self.file_name}
+
+    def __setstate__(self, state):
+        self.__init__(state['file_name'])
+        return
+
+    def get(self, mnx_id):
+        """ Get the annotations for a MetaNetX metabolite.
+
+        Parameters
+        ----------
+        mnx_id : str
+            MetaNetX metabolite ID (for example, MNXM41)
+
+        Returns
+        -------
+        dict or None
+            Dictionary keyed by note name of annotation values or None if the metabolite is not available
+        """
+
+        rows = self._query('SELECT {0} FROM annotations WHERE mnx_id = ?'.format(self._columns()), (mnx_id,))
+        if len(rows) == 0:
+            return None
+        return dict(zip(ANNOTATION_NOTES, rows[0]))
+
+    def get_metabolite(self, metabolite):
+        """ Get the annotations for a metabolite in a universal model.
+
+        Parameters
+        ----------
+        metabolite : cobra.core.Metabolite
+            Metabolite from universal model created with an annotation file
+
+        Returns
+        -------
+        dict or None
+            Dictionary keyed by note name of annotation values or None if the metabolite is not available
+        """
+
+        return self.get(_get_metanetx_compound_id(metabolite))
+
+    def get_many(self, mnx_ids):
+        """ Get the annotations for a list of MetaNetX metabolites.
+
+        Parameters
+        ----------
+        mnx_ids : list of str
+            List of MetaNetX metabolite IDs
+
+        Returns
+        -------
+        dict
+            Dictionary keyed by MetaNetX ID of dictionary of annotation values (metabolites
+            that are not available are not included)
+        """
+
+        mnx_ids = list(mnx_ids)
+        annotations = dict()
+        for start in range(0, len(mnx_ids), 500):
+            batch = mnx_ids[start:start + 500]
+            rows = self._query('SELECT mnx_id, {0} FROM annotations WHERE mnx_id IN ({1})'
+                               .format(self._columns(), ', '.join(['?'] * len(batch))), batch)
+            for row in rows:
+                annotations[row[0]] = dict(zip(ANNOTATION_NOTES, row[1:]))
+        return annotations
+
+    def close(self):
+        """ Close the annotation file. """
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        return
+
+    def _query(self, statement, parameters=()):
+        """ Run a query on the annotation file, opening the file when needed. """
+
+        with self._lock:
+            if self._connection is None or self._pid != getpid():
+                self._connection = sqlite3.connect(self.file_name, check_same_thread=False)
+                self._pid = getpid()
+            return self._connection.execute(statement, parameters).fetchall()
+
+    @staticmethod
+    def _columns():
+        """ Get the list of columns for the annotation values. """
+
+        return ', '.join(_annotation_column(x) for x in ANNOTATION_NOTES)
+
+
+def save_metanetx_snapshot(universal, folder):
+    """ Save a MetaNetX universal model to a binary snapshot folder.
+
+    A snapshot has a table of compounds, a table of metabolites (a compound in
+    a compartment), and a table of reactions with the stoichiometry stored as a
+    sparse matrix in compressed sparse row arrays. Every table is stored in NumPy
+    binary files that are memory-mapped when the snapshot is loaded.
+
+    Parameters
+    ----------
+    universal : cobra.Model
+        Universal model from create_metanetx_universal_model()
+    folder : str
+        Path to folder for storing snapshot
+    """
+
+    if not exists(folder):
+        makedirs(folder)
+    metadata_file_name = join(folder, SNAPSHOT_METADATA_FILE_NAME)
+    if exists(metadata_file_name):
+        unlink(metadata_file_name)
+
+    # Build the compound table from the metabolites, where all of the metabolites
+    # for the same compound in different compartments share one row.
+    compartment_ids = sorted(set(universal.compartments) | set(m.compartment for m in universal.metabolites))
+    compartment_index = dict((compartment_id, index) for index, compartment_id in enumerate(compartment_ids))
+    compound_index = dict()
+    compounds = list()
+    metabolite_compound = np.zeros(len(universal.metabolites), dtype=np.int32)
+    metabolite_compartment = np.zeros(len(universal.metabolites), dtype=np.int32)
+    for index, metabolite in enumerate(universal.metabolites):
+        compound_id = _get_metanetx_compound_id(metabolite)
+        if compound_id not in compound_index:
+            compound_index[compound_id] = len(compounds)
+            compounds.append((compound_id, metabolite))
+        metabolite_compound[index] = compound_index[compound_id]
+        metabolite_compartment[index] = compartment_index[metabolite.compartment]
+    np.save(join(folder, 'metabolite_compound.npy'), metabolite_compound)
+    np.save(join(folder, 'metabolite_compartment.npy'), metabolite_compartment)
+
+    _save_string_table(folder, 'compound_id', [x[0] for x in compounds])
+    _save_string_table(folder, 'compound_name', [x[1].name for x in compounds])
+    _save_string_table(folder, 'compound_formula', [x[1].formula for x in compounds])
+    np.save(join(folder, 'compound_charge.npy'),
+            np.array([x[1].charge if x[1].charge is not None else MISSING_CHARGE for x in compounds],
+                     dtype=np.int32))
+    np.save(join(folder, 'compound_mass.npy'),
+            np.array([x[1].notes.get('mass', np.nan) for x in compounds], dtype=np.float64))
+    for name in SNAPSHOT_METABOLITE_NOTES:
+        _save_string_table(folder, 'compound_{0}'.format(name), [x[1].notes.get(name, '') for x in compounds])
+
+    # Build the reaction table and the stoichiometry matrix with a row for each
+    # reaction and a column for each metabolite.
+    metabolite_index = dict((metabolite.id, index) for index, metabolite in enumerate(universal.metabolites))
+    indptr = np.zeros(len(universal.reactions) + 1, dtype=np.int64)
+    indices = list()
+    data = list()
+    for index, reaction in enumerate(universal.reactions):
+        for metabolite in sorted(reaction.metabolites, key=lambda x: metabolite_index[x.id]):
+            indices.append(metabolite_index[metabolite.id])
+            data.append(reaction.metabolites[metabolite])
+        indptr[index + 1] = len(indices)
+    np.save(join(folder, 'stoichiometry_indptr.npy'), indptr)
+    np.save(join(folder, 'stoichiometry_indices.npy'), np.array(indices, dtype=np.int32))
+    np.save(join(folder, 'stoichiometry_data.npy'), np.array(data, dtype=np.float64))
+    np.save(join(folder, 'reaction_bounds.npy'),
+            np.array([(r.lower_bound, r.upper_bound) for r in universal.reactions], dtype=np.float64))
+    _save_string_table(folder, 'reaction_id', [r.id for r in universal.reactions])
+    _save_string_table(folder, 'reaction_name', [r.name for r in universal.reactions])
+    _save_string_table(folder, 'reaction_ec', [r.notes.get('EC_number', '') for r in universal.reactions])
+    _save_string_table(folder, 'reaction_aliases',
+                       [';'.join('{0}:{1}'.format(k, v) for k, v in sorted(r.notes.get('aliases', dict()).items()))
+                        for r in universal.reactions])
+
+    # Write the metadata file last so an incomplete snapshot is never loaded.
+    metadata = {
+        'format': SNAPSHOT_FORMAT,
+        'version': metanetx_version,
+        'id': universal.id,
+        'name': universal.name,
+        'notes': universal.notes,
+        'compartments': universal.compartments,
+        'compartment_ids': compartment_ids
     }
+    with open(metadata_file_name + '.tmp', 'w') as handle:
+        json.dump(metadata, handle, indent=1)
+    replace_file(metadata_file_name + '.tmp', metadata_file_name)
+    LOGGER.info('Saved snapshot with %d metabolites and %d reactions to %s',
+                len(universal.metabolites), len(universal.reactions), folder)
+    return
 
-    # Accumulate all available Metabolite objects separately. Later when creating
-    # reactions, metabolites are put in a compartment.
-    all_metabolites = DictList()
 
-    # Create Metabolite objects for all of the metabolites from the downloaded file.
-    # Add all of the universal metabolites from the list.
-    LOGGER.info('Started creating Metabolite objects from %d lines in file', len(metabolite_list))
-    for index in range(len(metabolite_list)):
-        fields = metabolite_list[index]
+def load_metanetx_snapshot(folder, reaction_ids=None):
+    """ Load a MetaNetX universal model from a binary snapshot folder.
+
+    Parameters
+    ----------
+    folder : str
+        Path to folder with snapshot from save_metanetx_snapshot()
+    reaction_ids : list of str, optional
+        List of IDs of reactions to load (default is all reactions)
+
+    Returns
+    -------
+    cobra.Model
+        COBRA model object with universal reactions and metabolites
+    """
+
+    # Make sure the snapshot is complete and has a supported layout.
+    try:
+        with open(join(folder, SNAPSHOT_METADATA_FILE_NAME), 'r') as handle:
+            metadata = json.load(handle)
+    except (IOError, ValueError):
+        raise IOError('Folder "{0}" does not have a complete MetaNetX snapshot'.format(folder))
+    if metadata['format'] != SNAPSHOT_FORMAT:
+        raise ValueError('Snapshot format {0} in folder "{1}" is not the supported format {2}'
+                         .format(metadata['format'], folder, SNAPSHOT_FORMAT))
+    if metadata['version'] != metanetx_version:
+        warn('MetaNetX version "{0}" in snapshot is not the supported version "{1}"'
+             .format(metadata['version'], metanetx_version))
+
+    # Create an empty model.
+    universal = Model(metadata['id'], name=metadata['name'])
+    universal.notes.update(metadata['notes'])
+    for compartment_id in metadata['compartments']:
+        universal.compartments[compartment_id] = metadata['compartments'][compartment_id]
+
+    # Map the tables in the snapshot into memory.
+    indptr = _load_array(folder, 'stoichiometry_indptr')
+    indices = _load_array(folder, 'stoichiometry_indices')
+    data = _load_array(folder, 'stoichiometry_data')
+    bounds = _load_array(folder, 'reaction_bounds')
+    metabolite_compound = _load_array(folder, 'metabolite_compound')
+    metabolite_compartment = _load_array(folder, 'metabolite_compartment')
+    charges = _load_array(folder, 'compound_charge')
+    masses = _load_array(folder, 'compound_mass')
+    compound_tables = dict((name, _load_string_table(folder, 'compound_{0}'.format(name)))
+                           for name in ['id', 'name', 'formula'] + SNAPSHOT_METABOLITE_NOTES)
+    reaction_tables = dict((name, _load_string_table(folder, 'reaction_{0}'.format(name)))
+                           for name in ['id', 'name', 'ec', 'aliases'])
+
+    # Find the rows of the requested reactions.
+    if reaction_ids is None:
+        rows = range(len(reaction_tables['id']))
+    else:
+        row_index = dict((reaction_id, row) for row, reaction_id in enumerate(reaction_tables['id']))
+        rows = list()
+        for reaction_id in reaction_ids:
+            try:
+                rows.append(row_index[reaction_id])
+            except KeyError:
+                warn('Reaction {0} is not in snapshot'.format(reaction_id))
+
+    # Create Metabolite objects only when a reaction uses them.
+    metabolites = dict()
+
+    def get_metabolite(column):
+        if column not in metabolites:
+            compound = int(metabolite_compound[column])
+            compartment_id = metadata['compartment_ids'][metabolite_compartment[column]]
+            charge = int(charges[compound])
+            metabolite = Metabolite(id='{0}_{1}'.format(compound_tables['id'][compound], compartment_id),
+                                    name=compound_tables['name'][compound],
+                                    formula=compound_tables['formula'][compound],
+                                    compartment=compartment_id)
+            metabolite.charge = charge if charge != MISSING_CHARGE else None
+            if not np.isnan(masses[compound]):
+                metabolite.notes['mass'] = float(masses[compound])
+            for name in SNAPSHOT_METABOLITE_NOTES:
+                value = compound_tables[name][compound]
+                if len(value) > 0:
+                    metabolite.notes[name] = value
+            metabolites[column] = metabolite
+        return metabolites[column]
+
+    # Create Reaction objects from the rows of the stoichiometry matrix.
+    reactions = DictList()
+    for row in rows:
+        reaction = Reaction(id=reaction_tables['id'][row],
+                            name=reaction_tables['name'][row],
+                            lower_bound=float(bounds[row][0]),
+                            upper_bound=float(bounds[row][1]))
+        start, end = indptr[row], indptr[row + 1]
+        reaction.add_metabolites(dict((get_metabolite(column), coefficient)
+                                      for column, coefficient in zip(indices[start:end].tolist(),
+                                                                     data[start:end].tolist())))
+        ec_number = reaction_tables['ec'][row]
+        if len(ec_number) > 0:
+            reaction.notes['EC_number'] = ec_number
+        aliases = reaction_tables['aliases'][row]
+        if len(aliases) > 0:
+            reaction.notes['aliases'] = dict(x.split(':', 1) for x in aliases.split(';'))
+        reactions.append(reaction)
+    universal.add_reactions(reactions)
+    LOGGER.info('Loaded snapshot with %d metabolites and %d reactions from %s',
+                len(universal.metabolites), len(universal.reactions), folder)
+    return universal
+
+
+def get_metanetx_equation_cache_stats():
+    """ Get the statistics for the cache of parsed MetaNetX half equations.
+
+    The cache is in each process so the statistics do not include equations
+    parsed by worker processes.
+
+    Returns
+    -------
+    dict
+        Dictionary with number of 'hits' and 'misses', current 'size', maximum
+        size ('max_size'), and 'hit_rate'
+    """
+
+    hits = _half_equation_stats['hits']
+    misses = _half_equation_stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'size': len(_half_equation_cache),
+        'max_size': HALF_EQUATION_CACHE_SIZE,
+        'hit_rate': float(hits) / total if total > 0 else 0.0
+    }
+
+
+def _read_metanetx_reactions(reaction_list, verbose=False, processes=1, compartments=None):
+    """ Read the reactions and parse the reaction equations from a MetaNetX reaction file.
+
+    Parameters
+    ----------
+    reaction_list : iterable
+        Line index and data fields from each line in MetaNetX reaction file from _filter_metanetx_reactions()
+    verbose : bool, optional
+        When True, show warning messages
+    processes : int, optional
+        Number of worker processes for parsing reaction equations (None for number of CPUs)
+    compartments : list of str, optional
+        When specified, skip reactions with a metabolite in a compartment not in the list
+
+    Returns
+    -------
+    list of tuple
+        Data fields and parsed equation for each reaction with a valid equation
+    set
+        MetaNetX IDs of metabolites used in a reaction
+    """
+
+    field_names = REACTION_FIELD_NAMES
+
+    if compartments is not None:
+        compartments = set(compartments)
+
+    LOGGER.info('Started parsing reaction equations from lines in file')
+    reaction_rows = list()
+    used_ids = set()
+    for index, fields, terms in _parse_metanetx_reactions(reaction_list, len(field_names), processes):
+        if len(fields) != len(field_names):
+            if verbose:
+                warn('Skipped reaction on line {0} with missing fields: {1}'.format(index, fields))
+            continue
+        if terms is None:
+            if verbose:
+                warn('Could not parse equation for reaction {0} on line {1}: {2}'
+                     .format(fields[field_names['MNX_ID']], index, fields[field_names['Equation']]))
+            continue
+        if compartments is not None and not compartments.issuperset(terms[1]):
+            continue
+        used_ids.update(terms[0])
+        reaction_rows.append((fields, terms))
+    LOGGER.info('Finished parsing %d reaction equations using %d metabolites', len(reaction_rows), len(used_ids))
+    return reaction_rows, used_ids
+
+
+def _filter_metanetx_reactions(reaction_list, source_namespaces=None, balanced_only=False, ec_prefixes=None):
+    """ Skip the lines from a MetaNetX reaction file for reactions that do not match the filters.
+
+    Lines with missing fields are not skipped so they can be reported when they are read.
+
+    Parameters
+    ----------
+    reaction_list : iterable
+        Data fields from each line in MetaNetX reaction file
+    source_namespaces : list of str, optional
+        When specified, skip reactions with a source from a namespace not in the list
+    balanced_only : bool, optional
+        When True, skip reactions that MetaNetX does not mark as balanced
+    ec_prefixes : list of str, optional
+        When specified, skip reactions without an EC number starting with one of the prefixes
+
+    Yields
+    ------
+    tuple
+        Index of line in MetaNetX reaction file and list of data fields from each line that matches the filters
+    """
+
+    field_names = REACTION_FIELD_NAMES
+    if source_namespaces is not None:
+        source_namespaces = set(source_namespaces)
+    if ec_prefixes is not None:
+        ec_prefixes = [x.rstrip('.') for x in ec_prefixes]
+
+    # Keep the index of each line so warnings about a line have the position in the file.
+    num_skipped = 0
+    for index, fields in enumerate(reaction_list):
+        if len(fields) == len(field_names):
+            if balanced_only and fields[field_names['Balance']] != 'true':
+                num_skipped += 1
+                continue
+            if source_namespaces is not None and \
+                    fields[field_names['Source']].split(':', 1)[0] not in source_namespaces:
+                num_skipped += 1
+                continue
+            if ec_prefixes is not None and not _match_ec_prefix(fields[field_names['EC']], ec_prefixes):
+                num_skipped += 1
+                continue
+        yield index, fields
+    if num_skipped > 0:
+        LOGGER.info('Skipped %d reactions that do not match the filters', num_skipped)
+
+
+def _match_ec_prefix(ec_numbers, ec_prefixes):
+    """ Check if any EC number in a list of EC numbers starts with one of the prefixes.
+
+    A prefix matches whole levels of an EC number so prefix 2.7.1 matches 2.7.1.1
+    but not 2.7.10.1.
+
+    Parameters
+    ----------
+    ec_numbers : str
+        List of EC numbers separated by ';' character
+    ec_prefixes : list of str
+        List of EC number prefixes without a trailing '.' character
+
+    Returns
+    -------
+    bool
+        True when an EC number starts with one of the prefixes
+    """
+
+    for ec_number in ec_numbers.split(';'):
+        ec_number = ec_number.strip()
+        for prefix in ec_prefixes:
+            if ec_number == prefix or ec_number.startswith(prefix + '.'):
+                return True
+    return False
+
+
+def _read_metanetx_metabolites(metabolite_list, used_ids, verbose=False, annotations=None):
+    """ Create Metabolite objects from a MetaNetX metabolite file.
+
+    Parameters
+    ----------
+    metabolite_list : iterable
+        Data fields from each line in MetaNetX metabolite file
+    used_ids : set
+        MetaNetX IDs of metabolites to create (lines for other metabolites are skipped)
+    verbose : bool, optional
+        When True, show warning messages
+    annotations : _MetaNetXAnnotationWriter, optional
+        Writer for storing the bulky notes in an annotation file instead of in the notes
+
+    Returns
+    -------
+    dict
+        Dictionary keyed by MetaNetX ID of cobra.core.Metabolite objects without a compartment
+    """
+
+    field_names = METABOLITE_FIELD_NAMES
+
+    # Create Metabolite objects for the metabolites from the downloaded file that
+    # are used in a reaction and skip the rest of the lines. Later when creating
+    # reactions, metabolites are put in a compartment.
+    all_metabolites = dict()
+    LOGGER.info('Started creating Metabolite objects from lines in file')
+    for index, fields in enumerate(metabolite_list):
         if len(fields) < len(field_names):
             if verbose:
-                warn('Skipped metabolite on line {0} with missing fields: {1}'.format(index, metabolite_list[index]))
+                warn('Skipped metabolite on line {0} with missing fields: {1}'.format(index, fields))
+            continue
+        if fields[field_names['MNX_ID']] not in used_ids:
             continue
 
         # Create cobra.core.Metabolite from MetaNetX metabolite.
@@ -81,19 +1106,37 @@ def create_metanetx_universal_model(validate=False, verbose=False):
         mass = fields[field_names['Mass']]
         if len(mass) > 0:
             metabolite.notes['mass'] = float(mass)
-        metabolite.notes['InChI'] = fields[field_names['InChI']] \
+        notes = metabolite.notes if annotations is None else dict()
+        notes['InChI'] = fields[field_names['InChI']] \
             if len(fields[field_names['InChI']]) > 0 else 'NA'
-        metabolite.notes['SMILES'] = fields[field_names['SMILES']] \
+        notes['SMILES'] = fields[field_names['SMILES']] \
             if len(fields[field_names['SMILES']]) > 0 else 'NA'
-        metabolite.notes['source'] = fields[field_names['Source']] \
+        notes['source'] = fields[field_names['Source']] \
             if len(fields[field_names['Source']]) > 0 else 'NA'
-        metabolite.notes['InChIKey'] = fields[field_names['InChIKey']] \
+        notes['InChIKey'] = fields[field_names['InChIKey']] \
             if len(fields[field_names['InChIKey']]) > 0 else 'NA'
-        all_metabolites.append(metabolite)
+        if annotations is not None:
+            annotations.add(metabolite.id, notes)
+        all_metabolites[metabolite.id] = metabolite
     LOGGER.info('Finished creating %d Metabolite objects', len(all_metabolites))
+    return all_metabolites
+
 
-    # Download the compartments file.
-    compartment_list = _download_metanetx_file('comp_prop.tsv')
+def _read_metanetx_compartments(compartment_list, verbose=False):
+    """ Read the compartments from a MetaNetX compartment file.
+
+    Parameters
+    ----------
+    compartment_list : iterable
+        Data fields from each line in MetaNetX compartment file
+    verbose : bool, optional
+        When True, show warning messages
+
+    Returns
+    -------
+    dict
+        Dictionary keyed by MetaNetX compartment ID of compartment descriptions
+    """
 
     # Map field names to column numbers (MetaNetX may add fields in future).
     field_names = {
@@ -102,61 +1145,56 @@ def create_metanetx_universal_model(validate=False, verbose=False):
         'Source': 2
     }
 
-    # Add the compartments to the universal model.
-    LOGGER.info('Started adding compartments from %d lines in file', len(compartment_list))
-    for index in range(len(compartment_list)):
-        fields = compartment_list[index]
+    compartments = dict()
+    LOGGER.info('Started reading compartments from lines in file')
+    for index, fields in enumerate(compartment_list):
         if len(fields) < len(field_names):
             if verbose:
-                warn('Skipped compartment on line {0} with missing fields: {1}'.format(index, compartment_list[index]))
+                warn('Skipped compartment on line {0} with missing fields: {1}'.format(index, fields))
             continue
-        universal.compartments[fields[field_names['MNX_ID']]] = fields[field_names['Description']]
-    LOGGER.info('Finished adding {0} compartments to universal model'.format(len(universal.compartments)))
+        compartments[fields[field_names['MNX_ID']]] = fields[field_names['Description']]
+    return compartments
 
-    # Download the reactions file.
-    reaction_list = _download_metanetx_file('reac_prop.tsv')
 
-    # Map field names to column numbers (hopefully MetaNetX doesn't change this).
-    field_names = {
-        'MNX_ID': 0,
-        'Equation': 1,
-        'Description': 2,
-        'Balance': 3,
-        'EC': 4,
-        'Source': 5
-    }
+def _create_metanetx_reactions(reaction_rows, all_metabolites, verbose=False):
+    """ Create Reaction objects from reactions with parsed equations.
+
+    Parameters
+    ----------
+    reaction_rows : list of tuple
+        Data fields and parsed equation for each reaction from _read_metanetx_reactions()
+    all_metabolites : dict
+        Dictionary keyed by MetaNetX ID of cobra.core.Metabolite objects without a compartment
+    verbose : bool, optional
+        When True, show warning messages
+
+    Returns
+    -------
+    cobra.DictList
+        List of cobra.core.Reaction objects
+    """
+
+    field_names = REACTION_FIELD_NAMES
 
     # Accumulate Reaction and Metabolite objects separately because it is faster
     # than adding them one at a time to a model.
     reactions = DictList()
     metabolites = DictList()
 
-    # Create Reaction objects for all of the reactions from the downloaded file.
-    LOGGER.info('Started creating Reaction objects from %d lines in file', len(reaction_list))
-    for index in range(len(reaction_list)):
-        fields = reaction_list[index]
-        if len(fields) != len(field_names):
-            if verbose:
-                warn('Skipped reaction on line {0} with missing fields: {1}'.format(index, reaction_list[index]))
-            continue
-
+    LOGGER.info('Started creating Reaction objects from parsed equations')
+    for fields, terms in reaction_rows:
         # Create cobra.core.Reaction from MetaNetX reaction.
-        metabolite_info = _parse_metanetx_equation(fields[field_names['Equation']])
-        if metabolite_info is None:
-            if verbose:
-                warn('Could not parse equation for reaction {0} on line {1}: {2}'
-                     .format(fields[field_names['MNX_ID']], index, fields[field_names['Equation']]))
-            continue
         rxn_mets = dict()
-        for metabolite_id in metabolite_info:
+        for mnx_id, compartment, coefficient in zip(*terms):
+            metabolite_id = '{0}_{1}'.format(mnx_id, compartment)
             try:
-                rxn_mets[metabolites.get_by_id(metabolite_id)] = metabolite_info[metabolite_id]['coefficient']
+                rxn_mets[metabolites.get_by_id(metabolite_id)] = coefficient
             except KeyError:
-                metabolite = all_metabolites.get_by_id(metabolite_info[metabolite_id]['mnx_id']).copy()
+                metabolite = all_metabolites[mnx_id].copy()
                 metabolite.id = metabolite_id
-                metabolite.compartment = metabolite_info[metabolite_id]['compartment']
+                metabolite.compartment = compartment
                 metabolites.append(metabolite)
-                rxn_mets[metabolite] = metabolite_info[metabolite_id]['coefficient']
+                rxn_mets[metabolite] = coefficient
         reaction = Reaction(id=fields[field_names['MNX_ID']],
                             name=fields[field_names['MNX_ID']],
                             lower_bound=-1000.0,
@@ -174,84 +1212,452 @@ def create_metanetx_universal_model(validate=False, verbose=False):
                          .format(fields[field_names['MNX_ID']], fields[field_names['Source']]))
         reactions.append(reaction)
     LOGGER.info('Finished creating %d Reaction objects', len(reactions))
+    return reactions
 
-    # Add the reactions to the universal model.
-    universal.add_reactions(reactions)
-    LOGGER.info('Finished adding Reaction objects to universal model')
 
-    # If requested, validate the COBRA model.
-    if validate:
-        warn('Coming soon')
+class _MetaNetXAnnotationWriter(object):
+    """ Writer for storing the bulky notes of metabolites in an annotation file.
 
-    return universal
+    The annotations are written to a temporary file that replaces the annotation
+    file when the writer is closed. The temporary file is removed when writing
+    the annotations fails.
+    """
 
+    def __init__(self, file_name):
+        """ Initialize object.
 
-def create_metanetx_metabolite_xref(to_namespace, file_name):
-    """ Create a CobraBabel metabolite cross reference file for MetaNetX and specified namespace.
+        Parameters
+        ----------
+        file_name : str
+            Path to annotation file
+        """
+
+        self.file_name = file_name
+        self.temp_file_name = '{0}.tmp'.format(file_name)
+        if exists(self.temp_file_name):
+            unlink(self.temp_file_name)
+        self.connection = sqlite3.connect(self.temp_file_name)
+        self.rows = list()
+        completed = False
+        try:
+            self.connection.execute('CREATE TABLE info (name TEXT PRIMARY KEY, value TEXT)')
+            self.connection.execute('INSERT INTO info VALUES (?, ?)', ('version', metanetx_version))
+            self.connection.execute('CREATE TABLE annotations (mnx_id TEXT PRIMARY KEY, {0})'
+                                    .format(', '.join('{0} TEXT'.format(_annotation_column(x))
+                                                      for x in ANNOTATION_NOTES)))
+            completed = True
+        finally:
+            if not completed:
+                self.abort()
+        return
+
+    def add(self, mnx_id, notes):
+        """ Add the annotations for a metabolite.
+
+        Parameters
+        ----------
+        mnx_id : str
+            MetaNetX metabolite ID
+        notes : dict
+            Dictionary keyed by note name of annotation values
+        """
+
+        self.rows.append([mnx_id] + [notes[x] for x in ANNOTATION_NOTES])
+        if len(self.rows) >= ANNOTATION_BATCH_SIZE:
+            self._flush()
+        return
+
+    def close(self):
+        """ Write the remaining annotations and replace the annotation file. """
+
+        completed = False
+        try:
+            self._flush()
+            self.connection.commit()
+            completed = True
+        finally:
+            if not completed:
+                self.abort()
+        self.connection.close()
+        replace_file(self.temp_file_name, self.file_name)
+        return
+
+    def abort(self):
+        """ Discard the annotations and remove the temporary file. """
+
+        self.connection.close()
+        if exists(self.temp_file_name):
+            unlink(self.temp_file_name)
+        return
+
+    def _flush(self):
+        """ Write the pending annotations to the file. """
+
+        self.connection.executemany('INSERT OR REPLACE INTO annotations VALUES ({0})'
+                                    .format(', '.join(['?'] * (len(ANNOTATION_NOTES) + 1))), self.rows)
+        self.rows = list()
+        return
+
+
+def _annotation_column(name):
+    """ Get the name of the column in an annotation file for a note name. """
+
+    return name.lower()
+
+
+class _MetaNetXFiles(object):
+    """ Source of data fields from MetaNetX files.
+
+    When there is more than one worker, all of the files start downloading at
+    the same time to the cache folder (or to a temporary folder when there is
+    no cache folder) and a file can be read as soon as its download finishes.
+    Otherwise each file is downloaded when it is read.
+    """
+
+    def __init__(self, file_names, cache_folder=None, revalidate=False, workers=1):
+        """ Initialize object.
+
+        Parameters
+        ----------
+        file_names : list of str
+            Names of files to download from MetaNetX web site
+        cache_folder : str, optional
+            Path to folder for caching MetaNetX files
+        revalidate : bool, optional
+            When True, check if cached files are current with a conditional request
+        workers : int, optional
+            Number of files downloaded at the same time
+        """
+
+        self.cache_folder = cache_folder
+        self.revalidate = revalidate
+        self.temp_folder = None
+        self.executor = None
+        self.futures = dict()
+        self.stop = Event()
+        if workers > 1:
+            if cache_folder is None:
+                self.temp_folder = mkdtemp(prefix='metanetx_')
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+            for file_name in file_names:
+                self.futures[file_name] = self.executor.submit(_cache_metanetx_file, file_name,
+                                                               self.temp_folder or cache_folder, revalidate, self.stop)
+        return
+
+    def read(self, file_name):
+        """ Read the data fields from a MetaNetX file.
+
+        Parameters
+        ----------
+        file_name : str
+            Name of file to read
+
+        Returns
+        -------
+        iterable
+            Data fields from each line that is not a comment
+        """
+
+        if file_name in self.futures:
+            return _read_metanetx_cache_file(self.futures[file_name].result(), file_name)
+        return _download_metanetx_file(file_name, self.cache_folder, self.revalidate)
+
+    def close(self):
+        """ Stop downloads that are not finished and remove the temporary folder. """
+
+        if self.executor is not None:
+            self.stop.set()
+            for future in self.futures.values():
+                future.cancel()
+            self.executor.shutdown(wait=True)
+        if self.temp_folder is not None:
+            rmtree(self.temp_folder, ignore_errors=True)
+        return
+
+
+def _download_metanetx_file(file_name, cache_folder=None, revalidate=False):
+    """ Download and process a MetaNetX file.
+
+    The file is read in chunks and parsed one line at a time so the full file
+    is never in memory. When a cache folder is specified, the file is read from
+    a compressed copy in the cache folder and is only downloaded when it is not
+    in the cache or when revalidation finds a newer file on the MetaNetX web site.
 
     Parameters
     ----------
-    to_namespace : {'bigg', 'cco', 'chebi', 'envipath', 'go', 'hmdb', 'kegg', 'lipidmaps',
-                    'metacyc', 'reactome', 'rhea', 'sabiork', 'seed', 'slm'}
-        Namespace to cross reference to
     file_name : str
-        Path to file for storing CobraBabel cross reference
+        Name of file to download from MetaNetX web site
+    cache_folder : str, optional
+        Path to folder for caching MetaNetX files
+    revalidate : bool, optional
+        When True, check if the cached file is current with a conditional request
+
+    Yields
+    ------
+    list
+        List of data fields from each line that is not a comment
     """
 
-    _process_metanetx_xref(_download_metanetx_file('chem_xref.tsv'), to_namespace, file_name)
-    return
+    if cache_folder is None:
+        LOGGER.info('Started download of %s file', file_name)
+        response = get_transport().get('{0}{1}'.format(metanetx_url, file_name), stream=True)
+        if response.status_code != requests.codes.OK:
+            response.raise_for_status()
+        if response.encoding is None:
+            response.encoding = 'utf-8'
+        # Only split on newlines because str.splitlines() also splits on characters like U+2028 in descriptions.
+        lines = (line.rstrip('\r')
+                 for line in response.iter_lines(chunk_size=CHUNK_SIZE, decode_unicode=True, delimiter='\n'))
+        for fields in _parse_metanetx_lines(lines, file_name):
+            yield fields
+        LOGGER.info('Finished download of %s file', file_name)
+    else:
+        for fields in _read_metanetx_cache_file(_cache_metanetx_file(file_name, cache_folder, revalidate), file_name):
+            yield fields
 
 
-def create_metanetx_reaction_xref(to_namespace, file_name):
-    """ Create a CobraBabel reaction cross reference file for MetaNetX and specified namespace.
+def _read_metanetx_cache_file(path, file_name):
+    """ Read a MetaNetX file from a compressed copy in a cache folder.
 
     Parameters
     ----------
-    to_namespace : {'bigg', 'cco', 'chebi', 'envipath', 'go', 'hmdb', 'kegg', 'lipidmaps',
-                    'metacyc', 'reactome', 'rhea', 'sabiork', 'seed', 'slm'}
-        Namespace to cross reference to
+    path : str
+        Path to cached file
     file_name : str
-        Path to file for storing CobraBabel cross reference
+        Name of MetaNetX file
+
+    Yields
+    ------
+    list
+        List of data fields from each line that is not a comment
     """
 
-    _process_metanetx_xref(_download_metanetx_file('reac_xref.tsv'), to_namespace, file_name)
-    return
+    # Only split on newlines the same as a streamed download.
+    with open_gzip_text(path, newline='\n') as handle:
+        for fields in _parse_metanetx_lines((line.rstrip('\r\n') for line in handle), file_name):
+            yield fields
 
 
-def _download_metanetx_file(file_name):
-    """ Download and process a MetaNetX file.
+def _parse_metanetx_lines(lines, file_name):
+    """ Parse the lines from a MetaNetX file.
+
+    Parameters
+    ----------
+    lines : iterable of str
+        Lines from MetaNetX file without line endings
+    file_name : str
+        Name of MetaNetX file
+
+    Yields
+    ------
+    list
+        List of data fields from each line that is not a comment
+    """
+
+    for index, line in enumerate(lines):
+        # Assume that MetaNetX files have a version string on the first line.
+        if index == 0:
+            version = line.strip('# ')
+            if version != metanetx_version:
+                warn('MetaNetX version "{0}" in "{1}" file is not the supported version "{2}"'
+                     .format(version, file_name, metanetx_version))
+
+        # Skip comment lines and separate lines into fields.
+        if len(line) == 0 or line[0] == '#':
+            continue  # Skip empty lines and comment lines
+        yield line.split('\t')
+
+
+def _cache_metanetx_file(file_name, cache_folder, revalidate=False, stop=None):
+    """ Get the path to the cached copy of a MetaNetX file, downloading it when needed.
+
+    A cached file is compressed with gzip and stored in a sub-folder named by
+    the MetaNetX version from the first line of the file. A metadata file in the
+    cache folder records the version and the response headers used for
+    revalidating the cached file with a conditional request.
 
     Parameters
     ----------
     file_name : str
         Name of file to download from MetaNetX web site
+    cache_folder : str
+        Path to folder for caching MetaNetX files
+    revalidate : bool, optional
+        When True, check if the cached file is current with a conditional request
+    stop : threading.Event, optional
+        Event that is set when the download should stop before it is finished
 
     Returns
     -------
-    list
-        List of data fields from each line that is not a comment
+    str
+        Path to cached file
+
+    Raises
+    ------
+    IOError
+        When the download is stopped before it is finished
     """
 
+    _make_folder(cache_folder)
+    metadata_file_name = join(cache_folder, '{0}.json'.format(file_name))
+    try:
+        with open(metadata_file_name, 'r') as handle:
+            metadata = json.load(handle)
+        if not exists(join(cache_folder, metadata['path'])):
+            metadata = None
+    except (IOError, ValueError):
+        metadata = None
+
+    # Use the cached file without any request unless asked to revalidate.
+    headers = dict()
+    if metadata is not None:
+        if not revalidate:
+            LOGGER.info('Using cached %s file for version "%s"', file_name, metadata['version'])
+            return join(cache_folder, metadata['path'])
+        if metadata.get('etag') is not None:
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified') is not None:
+            headers['If-Modified-Since'] = metadata['last_modified']
+
     LOGGER.info('Started download of %s file', file_name)
-    response = requests.get('{0}{1}'.format(metanetx_url, file_name))
+    response = get_transport().get('{0}{1}'.format(metanetx_url, file_name), headers=headers, stream=True)
+    if response.status_code == requests.codes.NOT_MODIFIED and metadata is not None:
+        LOGGER.info('Cached %s file for version "%s" is current', file_name, metadata['version'])
+        response.close()
+        return join(cache_folder, metadata['path'])
     if response.status_code != requests.codes.OK:
         response.raise_for_status()
+
+    # Compress the file into the cache folder as it is downloaded. Remove the
+    # incomplete file when the download fails or is stopped.
+    temp_file_name = join(cache_folder, '{0}.gz.tmp'.format(file_name))
+    try:
+        with gzip.open(temp_file_name, 'wb', compresslevel=CACHE_COMPRESS_LEVEL) as handle:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if stop is not None and stop.is_set():
+                    raise IOError('Stopped download of {0} file before it finished'.format(file_name))
+                handle.write(chunk)
+    except Exception:
+        response.close()
+        if exists(temp_file_name):
+            unlink(temp_file_name)
+        raise
     LOGGER.info('Finished download of %s file', file_name)
-    all_lines = response.text.split('\n')
 
-    # Assume that MetaNetX files have a version string on the first line.
-    version = all_lines[0].strip('# ')
-    if version != metanetx_version:
-        warn('MetaNetX version "{0}" in "{1}" file is not the supported version "{2}"'
-             .format(version, file_name, metanetx_version))
+    # Move the file to the sub-folder for the version on the first line.
+    with open_gzip_text(temp_file_name) as handle:
+        version = handle.readline().strip('# \r\n')
+    version_folder = re.sub(r'[^0-9A-Za-z.]+', '_', version)
+    _make_folder(join(cache_folder, version_folder))
+    path = join(version_folder, '{0}.gz'.format(file_name))
+    replace_file(temp_file_name, join(cache_folder, path))
 
-    # Remove comment lines and separate lines into fields.
-    data = list()
-    for line in all_lines:
-        if len(line) == 0 or line[0] == '#':
-            continue  # Skip empty lines and comment lines
-        data.append(line.split('\t'))
-    return data
+    metadata = {
+        'version': version,
+        'path': path,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified')
+    }
+    with open(metadata_file_name, 'w') as handle:
+        json.dump(metadata, handle, indent=1)
+    return join(cache_folder, path)
+
+
+def _parse_metanetx_reactions(reaction_list, num_fields, processes=1):
+    """ Parse the equations of the reactions from a MetaNetX reaction file.
+
+    When there is more than one process, chunks of equations are parsed by a
+    pool of worker processes. A limited number of chunks are in progress at one
+    time so the full file is never in memory and the results are returned in the
+    same order as the lines in the file.
+
+    Parameters
+    ----------
+    reaction_list : iterable
+        Line index and data fields from each line in MetaNetX reaction file
+    num_fields : int
+        Number of data fields in a valid line
+    processes : int, optional
+        Number of worker processes for parsing equations (None for number of CPUs)
+
+    Yields
+    ------
+    tuple
+        Line index, data fields from line, and parsed equation from _parse_metanetx_equation_chunk()
+    """
+
+    if processes == 1:
+        for index, fields in reaction_list:
+            equation = fields[1] if len(fields) == num_fields else None
+            yield index, fields, _parse_metanetx_equation_chunk([equation])[0]
+        return
+
+    if processes is None:
+        processes = cpu_count()
+    reaction_list = iter(reaction_list)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = deque()
+        while True:
+            chunk = list(islice(reaction_list, EQUATION_CHUNK_SIZE))
+            if len(chunk) > 0:
+                equations = [x[1][1] if len(x[1]) == num_fields else None for x in chunk]
+                pending.append((chunk, executor.submit(_parse_metanetx_equation_chunk, equations)))
+
+            # Keep two chunks in progress for each worker process.
+            if len(pending) == 0:
+                break
+            if len(chunk) > 0 and len(pending) < 2 * processes:
+                continue
+            chunk, future = pending.popleft()
+            for (index, fields), terms in zip(chunk, future.result()):
+                yield index, fields, terms
+
+
+def _parse_metanetx_equation_chunk(equations):
+    """ Parse a chunk of MetaNetX equation strings into compact metabolite information.
+
+    Parameters
+    ----------
+    equations : list of str
+        Equation strings from MetaNetX reactions (None for a reaction without an equation)
+
+    Returns
+    -------
+    list of tuple
+        For each equation, a tuple with a tuple of MetaNetX metabolite IDs, a tuple of
+        compartment IDs, and a tuple of coefficients, or None if the equation cannot be
+        parsed
+    """
+
+    results = list()
+    for equation in equations:
+        metabolite_info = _parse_metanetx_equation(equation) if equation is not None else None
+        if metabolite_info is None:
+            results.append(None)
+            continue
+        info_list = [metabolite_info[x] for x in metabolite_info]
+        results.append((tuple(x['mnx_id'] for x in info_list),
+                        tuple(x['compartment'] for x in info_list),
+                        tuple(x['coefficient'] for x in info_list)))
+    return results
+
+
+def _make_folder(folder):
+    """ Create a folder when it does not exist, allowing for another thread creating it at the same time.
+
+    Parameters
+    ----------
+    folder : str
+        Path to folder
+    """
+
+    if not exists(folder):
+        try:
+            makedirs(folder)
+        except OSError:
+            if not exists(folder):
+                raise
+    return
 
 
 def _parse_metanetx_equation(equation):
@@ -263,6 +1669,9 @@ def _parse_metanetx_equation(equation):
 
     2 MNXM2@MNXD1 + 2 MNXM947@MNXD1 = 1 MNXM4@MNXD1 + 2 MNXM470@MNXD1
 
+    Many reactions share the same reactants or products so the parsed half
+    equations are cached.
+
     Parameters
     ----------
     equation : str
@@ -279,69 +1688,285 @@ def _parse_metanetx_equation(equation):
     parts = equation.split(' = ')
     if len(parts) != 2:
         return None
+    reactants = _parse_metanetx_half_equation(parts[0])
+    if reactants is None:
+        return None
+    products = _parse_metanetx_half_equation(parts[1])
+    if products is None:
+        return None
 
     # Build a dictionary keyed by metabolite ID with the information needed for
     # setting the metabolites in a cobra.core.Reaction object.
     metabolites = dict()
-    reactants = parts[0].split(' + ')
-    for r in reactants:
-        match = re.search(metabolite_re, r)
-        if match is None:
-            return None
-        met_id = '{0}_{1}'.format(match.group(2), match.group(3))
-        metabolites[met_id] = {
-            'mnx_id': match.group(2),
-            'coefficient': -1.0 * float(match.group(1)),
-            'compartment': match.group(3)
-        }
-    products = parts[1].split(' + ')
-    for p in products:
-        match = re.search(metabolite_re, p)
-        if match is None:
-            return None
-        met_id = '{0}_{1}'.format(match.group(2), match.group(3))
-        metabolites[met_id] = {
-            'mnx_id': match.group(2),
-            'coefficient': float(match.group(1)),
-            'compartment': match.group(3)
-        }
+    for terms, sign in [(reactants, -1.0), (products, 1.0)]:
+        for mnx_id, compartment, coefficient in terms:
+            metabolites['{0}_{1}'.format(mnx_id, compartment)] = {
+                'mnx_id': mnx_id,
+                'coefficient': sign * coefficient,
+                'compartment': compartment
+            }
 
     return metabolites
 
 
+def _parse_metanetx_half_equation(half_equation):
+    """ Parse the reactants or products from an equation string into metabolite terms.
+
+    The terms are found and the whole string is confirmed to be metabolite terms
+    separated by " + " with one scan of the string. The same half equation is in
+    many reactions so the parsed terms are cached.
+
+    Parameters
+    ----------
+    half_equation : str
+        Reactants or products from an equation string
+
+    Returns
+    -------
+    tuple or None
+        Tuple with MetaNetX ID, compartment ID, and coefficient of each metabolite
+        or None if string cannot be parsed
+    """
+
+    # Move a cached half equation to the end so the least recently used half equation is first.
+    try:
+        terms = _half_equation_cache.pop(half_equation)
+        _half_equation_cache[half_equation] = terms
+        _half_equation_stats['hits'] += 1
+        return terms
+    except KeyError:
+        _half_equation_stats['misses'] += 1
+
+    # Each term must start right after the separator that follows the previous term
+    # and the last term must end at the end of the string.
+    terms = list()
+    end = None
+    for match in metabolite_re.finditer(half_equation):
+        if end is None:
+            valid = match.start() == 0
+        else:
+            valid = match.start() == end + len(TERM_SEPARATOR) and half_equation.startswith(TERM_SEPARATOR, end)
+        if not valid:
+            break
+        terms.append((match.group(2), match.group(3), float(match.group(1))))
+        end = match.end()
+    else:
+        valid = end == len(half_equation)
+    terms = tuple(terms) if valid else None
+
+    # Remove the least recently used half equation when the cache is full so it does not grow without limit.
+    if len(_half_equation_cache) >= HALF_EQUATION_CACHE_SIZE:
+        _half_equation_cache.popitem(last=False)
+    _half_equation_cache[half_equation] = terms
+    return terms
+
+
 def _process_metanetx_xref(xref_list, to_namespace, file_name):
     """ Process lines from cross reference file.
 
     Parameters
     ----------
-    xref_list : list
-        List of data fields from MetaNetX cross reference file
+    xref_list : iterable
+        Data fields from each line in MetaNetX cross reference file
     to_namespace : str
         Namespace to cross reference to
     file_name : str
         Path to file for storing CobraBabel cross reference
     """
 
-    # Extract the cross reference lines for the specified to_namespace.
-    namespace_list = [x for x in xref_list if x[0].startswith(to_namespace)]
-    if len(namespace_list) == 0:
-        raise ValueError('Namespace "{0}" is not available in cross reference file'
-                         .format(to_namespace))
+    field_names = XREF_FIELD_NAMES
 
-    # Map field names to column numbers (hopefully MetaNetX doesn't change this).
-    field_names = {
-        'XREF': 0,
-        'MNX_ID': 1,
-        'Evidence': 2,
-        'Description': 3
-    }
-
-    # Generate a CobraBabel cross reference file, removing to_namespace prefix from
-    # cross referenced ID.
+    # Generate a CobraBabel cross reference file from the cross reference lines for
+    # the specified to_namespace, removing to_namespace prefix from cross referenced ID.
+    # The lines are written to a temporary file that replaces the file when the
+    # download is complete so a failed download does not leave an incomplete file.
     prefix = len(to_namespace) + 1
-    with open(file_name, 'w') as handle:
-        handle.write('\t'.join(['metanetx', to_namespace]) + '\n')
-        for fields in namespace_list:
-            handle.write('\t'.join([fields[field_names['MNX_ID']], fields[field_names['XREF']][prefix:]]) + '\n')
+    count = 0
+    temp_file_name = file_name + '.tmp'
+    try:
+        with open(temp_file_name, 'w') as handle:
+            handle.write('\t'.join(['metanetx', to_namespace]) + '\n')
+            for fields in xref_list:
+                if fields[field_names['XREF']].startswith(to_namespace):
+                    handle.write('\t'.join([fields[field_names['MNX_ID']], fields[field_names['XREF']][prefix:]]) +
+                                 '\n')
+                    count += 1
+        if count == 0:
+            raise ValueError('Namespace "{0}" is not available in cross reference file'
+                             .format(to_namespace))
+    except Exception:
+        if exists(temp_file_name):
+            unlink(temp_file_name)
+        raise
+    replace_file(temp_file_name, file_name)
+
+    return
+
+
+def _get_metanetx_compound_id(metabolite):
+    """ Get the MetaNetX compound ID from a metabolite in a compartment.
+
+    Parameters
+    ----------
+    metabolite : cobra.Metabolite
+        Metabolite with an ID of the form <compound>_<compartment>
+
+    Returns
+    -------
+    str
+        Compound ID
+    """
+
+    suffix = '_{0}'.format(metabolite.compartment)
+    if metabolite.id.endswith(suffix):
+        return metabolite.id[:-len(suffix)]
+    return metabolite.id
+
+
+def _save_string_table(folder, name, values):
+    """ Save a list of strings as a byte array and an array of offsets in a snapshot folder.
+
+    Parameters
+    ----------
+    folder : str
+        Path to snapshot folder
+    name : str
+        Name of table
+    values : list of str
+        Strings to store in table
+    """
 
+    encoded = [(x if x is not None else '').encode('utf-8') for x in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(x) for x in encoded])
+    np.save(join(folder, '{0}_offsets.npy'.format(name)), offsets)
+    np.save(join(folder, '{0}_bytes.npy'.format(name)), np.frombuffer(b''.join(encoded), dtype=np.uint8))
     return
+
+
+def _load_array(folder, name):
+    """ Map an array in a snapshot folder into memory.
+
+    Parameters
+    ----------
+    folder : str
+        Path to snapshot folder
+    name : str
+        Name of array
+
+    Returns
+    -------
+    numpy.ndarray
+        Read-only memory-mapped array
+    """
+
+    # A plain array view of the memory map avoids the overhead of numpy.memmap indexing.
+    return np.asarray(np.load(join(folder, '{0}.npy'.format(name)), mmap_mode='r'))
+
+
+def _create_string_table(values):
+    """ Create a table of strings stored as UTF-8 bytes and an array of offsets.
+
+    Parameters
+    ----------
+    values : iterable of str
+        Strings to store in table
+
+    Returns
+    -------
+    _StringTable
+        Table of strings
+    """
+
+    encoded = [_encode_string(x) for x in values]
+    offsets = array('l', [0])
+    total = 0
+    for value in encoded:
+        total += len(value)
+        offsets.append(total)
+    return _StringTable(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+
+def _encode_string(value):
+    """ Encode a string as UTF-8 bytes.
+
+    Parameters
+    ----------
+    value : str or bytes
+        String to encode (Python 2 str values are already bytes)
+
+    Returns
+    -------
+    bytes
+        UTF-8 bytes of string
+    """
+
+    if isinstance(value, bytes):
+        return value
+    return value.encode('utf-8')
+
+
+def _load_string_table(folder, name):
+    """ Load a table of strings from a snapshot folder.
+
+    Parameters
+    ----------
+    folder : str
+        Path to snapshot folder
+    name : str
+        Name of table
+
+    Returns
+    -------
+    _StringTable
+        Table of strings with the bytes mapped into memory
+    """
+
+    return _StringTable(_load_array(folder, '{0}_bytes'.format(name)),
+                        _load_array(folder, '{0}_offsets'.format(name)).tolist())
+
+
+class _StringTable(object):
+    """ Table of strings stored as UTF-8 bytes and offsets that are decoded when accessed. """
+
+    def __init__(self, data, offsets):
+        """ Initialize object.
+
+        Parameters
+        ----------
+        data : numpy.ndarray
+            UTF-8 bytes of all of the strings
+        offsets : array.array or list of int
+            Offset in data of the start of each string and the end of the last string
+        """
+
+        self.data = data
+        self.offsets = offsets
+        self._view = memoryview(data)
+        return
+
+    def __getstate__(self):
+        # A memoryview cannot be pickled so it is created again when the object is unpickled.
+        state = self.__dict__.copy()
+        del state['_view']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._view = memoryview(self.data)
+        return
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.get_bytes(index).decode('utf-8')
+
+    def get_bytes(self, index):
+        """ Get the UTF-8 bytes of a string without decoding them. """
+
+        return self._view[self.offsets[index]:self.offsets[index + 1]].tobytes()
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
@@ -1,4 +1,5 @@
 import pytest
+import cobrababel.transport
 from os.path import join, abspath, dirname
 from tempfile import gettempdir
 
@@ -24,3 +25,13 @@ def vmh_metabolite_xref():
 @pytest.fixture(scope='session')
 def test_folder():
     return gettempdir()
+
+
+@pytest.fixture
+def fake_transport(monkeypatch):
+    """ Install a transport for the test and restore the shared transport after the test. """
+
+    def install(transport):
+        monkeypatch.setattr(cobrababel.transport, '_transport', transport)
+        return transport
+    return install
@@ -1,6 +1,111 @@
 import pytest
+from os.path import join
+from os import unlink
+import gzip
+import io
+import json
+import sqlite3
+import requests
+from urllib3.response import HTTPResponse
 import cobrababel
-from cobra import Model
+from cobra import Model, Metabolite, Reaction
+from cobra.io import save_json_model, load_json_model, to_json, from_json, to_yaml, from_yaml
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+        self.status_code = 200
+
+    def json(self):
+        return self.data
+
+
+class FakeBigg:
+    """ Transport that answers BiGG data API requests from dictionaries. """
+
+    def __init__(self, metabolites, reactions, last_updated):
+        self.metabolites = metabolites
+        self.reactions = reactions
+        self.last_updated = last_updated
+        self.urls = list()
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        parts = url[len(cobrababel.bigg.bigg_url):].split('/')
+        if parts[0] == 'database_version':
+            return FakeResponse({'bigg_models_version': '1.0', 'last_updated': self.last_updated})
+        objects = self.metabolites if parts[1] == 'metabolites' else self.reactions
+        if len(parts) == 2:
+            return FakeResponse({'results': [{'bigg_id': x, 'name': x} for x in sorted(objects)]})
+        if parts[1] == 'metabolites':
+            return FakeResponse({'bigg_id': parts[2], 'name': parts[2], 'formulae': [], 'charges': [],
+                                 'compartments_in_models': [{'bigg_id': x} for x in objects[parts[2]]],
+                                 'database_links': {'KEGG Compound': [{'id': 'C' + parts[2]}]}})
+        return FakeResponse({'bigg_id': parts[2], 'name': parts[2], 'pseudoreaction': parts[2].startswith('BIOMASS'),
+                             'reaction_string': '&#8652;', 'database_links': {},
+                             'metabolites': [{'bigg_id': x[0], 'compartment_bigg_id': x[1], 'stoichiometry': x[2]}
+                                             for x in objects[parts[2]]]})
+
+
+class FakeModelResponse(FakeResponse):
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start:start + chunk_size]
+
+
+class FakeBiggModels:
+    """ Transport that answers BiGG model requests from a dictionary of models. """
+
+    def __init__(self, models, last_updated):
+        self.models = models
+        self.last_updated = last_updated
+        self.downloads = list()
+
+    def get(self, url, **kwargs):
+        parts = url[len(cobrababel.bigg.bigg_url):].split('/')
+        model = self.models[parts[1]]
+        if len(parts) == 3:
+            self.downloads.append(parts[1])
+            handle = io.StringIO()
+            save_json_model(model, handle)
+            return FakeModelResponse(handle.getvalue().encode('utf-8'))
+        return FakeResponse({'bigg_id': model.id, 'organism': model.id + ' organism', 'genome_name': 'genome',
+                             'reference_type': 'pmid', 'reference_id': '1', 'last_updated': self.last_updated,
+                             'reaction_count': len(model.reactions), 'metabolite_count': len(model.metabolites),
+                             'gene_count': len(model.genes)})
+
+
+class ChunkedReader(io.BytesIO):
+    """ File object that returns a few bytes at a time like a chunked response body. """
+
+    def read(self, size=-1):
+        if size is not None and size > 0:
+            size = min(size, 7)
+        return io.BytesIO.read(self, size)
+
+
+def make_gzip_response(body):
+    compressed = io.BytesIO()
+    with gzip.GzipFile(fileobj=compressed, mode='wb') as handle:
+        handle.write(body)
+    response = requests.Response()
+    response.status_code = 200
+    response.headers['Content-Encoding'] = 'gzip'
+    response.raw = HTTPResponse(body=ChunkedReader(compressed.getvalue()), headers={'Content-Encoding': 'gzip'},
+                                status=200, preload_content=False, decode_content=False)
+    return response
+
+
+def make_bigg_model(bigg_id):
+    model = Model(bigg_id)
+    a = Metabolite('a_c', compartment='c')
+    b = Metabolite('b_c', compartment='c')
+    reaction = Reaction('R1')
+    reaction.add_metabolites({a: -1, b: 1})
+    reaction.gene_reaction_rule = 'g1'
+    model.add_reactions([reaction])
+    return model
 
 
 class TestBigg:
@@ -21,6 +126,25 @@ class TestBigg:
         solution = model.optimize()
         assert solution.f == pytest.approx(0.736701)
 
+    def test_create_model_streamed(self, monkeypatch, fake_transport):
+        model = make_bigg_model('m1')
+        handle = io.StringIO()
+        save_json_model(model, handle)
+        body = handle.getvalue().encode('utf-8')
+        details = json.dumps({'bigg_id': 'm1', 'organism': 'm1 organism', 'genome_name': 'genome',
+                              'reference_type': 'pmid', 'reference_id': '1', 'last_updated': '1',
+                              'reaction_count': 1, 'metabolite_count': 2, 'gene_count': 1}).encode('utf-8')
+        transport = cobrababel.Transport(rate_limits={})
+        monkeypatch.setattr(transport.session, 'get', lambda url, **kwargs:
+                            make_gzip_response(body if url.endswith('/download') else details))
+        fake_transport(transport)
+        streamed = cobrababel.create_cobra_model_from_bigg_model('m1')
+        expected = load_json_model(io.StringIO(transport.get('http://bigg.ucsd.edu/api/v2/models/m1/download').text))
+        assert streamed.name == 'm1 organism'
+        assert [x.id for x in streamed.metabolites] == [x.id for x in expected.metabolites]
+        assert [x.reaction for x in streamed.reactions] == [x.reaction for x in expected.reactions]
+        assert [x.gene_reaction_rule for x in streamed.reactions] == [x.gene_reaction_rule for x in expected.reactions]
+
     def test_add_metabolite(self):
         model = Model('bigg_test')
         cobrababel.add_bigg_metabolites([cobrababel.get_bigg_metabolite('h2o_c', 'iAF1260')], model)
@@ -45,3 +169,253 @@ class TestBigg:
         assert model.reactions[0].reaction == 'cynt_p + h_p --> cynt_c + h_c'
         assert len(model.reactions[0].metabolites) == 4
         assert len(model.compartments) == 2
+
+    def test_download_objects(self):
+        id_list = ['id{0}'.format(index) for index in range(10)]
+        results = cobrababel.bigg._download_bigg_objects(lambda x: {'bigg_id': x}, id_list, 'metabolite', 4)
+        assert [x['bigg_id'] for x in results] == id_list
+
+    def test_resume_download(self, tmpdir):
+        file_name = str(tmpdir.join('bigg_journal.json'))
+        version = {'bigg_models_version': '1.0', 'last_updated': 'today'}
+        id_list = ['id{0}'.format(index) for index in range(5)]
+        journal = cobrababel.bigg._BiggJournal(file_name, version)
+        cobrababel.bigg._download_bigg_objects(lambda x: {'bigg_id': x}, id_list[:3], 'metabolite', 1, journal)
+        journal.close()
+        journal = cobrababel.bigg._BiggJournal(file_name, version, resume=True)
+        assert len(journal.completed('metabolite')) == 3
+        assert len(journal.completed('metabolite')) == 3
+        downloaded = list()
+
+        def get_function(bigg_id):
+            downloaded.append(bigg_id)
+            return {'bigg_id': bigg_id}
+        results = cobrababel.bigg._download_bigg_objects(get_function, id_list, 'metabolite', 1, journal)
+        journal.close()
+        assert downloaded == id_list[3:]
+        assert [x['bigg_id'] for x in results] == id_list
+
+    def test_resume_incomplete_journal(self, tmpdir):
+        file_name = str(tmpdir.join('bigg_journal.json'))
+        version = {'bigg_models_version': '1.0', 'last_updated': 'today'}
+        journal = cobrababel.bigg._BiggJournal(file_name, version)
+        cobrababel.bigg._download_bigg_objects(lambda x: {'bigg_id': x}, ['id0', 'id1'], 'metabolite', 1, journal)
+        journal.close()
+        with open(file_name, 'a') as handle:
+            handle.write('{"type": "metabolite", "bigg_id": "id2", "da')
+        journal = cobrababel.bigg._BiggJournal(file_name, version, resume=True)
+        cobrababel.bigg._download_bigg_objects(lambda x: {'bigg_id': x}, ['id0', 'id1', 'id2'], 'metabolite', 1,
+                                               journal)
+        journal.close()
+        journal = cobrababel.bigg._BiggJournal(file_name, version, resume=True)
+        journal.close()
+        assert sorted(journal.completed('metabolite')) == ['id0', 'id1', 'id2']
+
+    def test_update_universal(self, fake_transport):
+        fake_transport(FakeBigg({'a': ['c', 'e'], 'b': ['c']},
+                                {'R1': [('a', 'c', -1), ('b', 'c', 1)], 'R2': [('a', 'c', -1), ('a', 'e', 1)]}, '1'))
+        universal = cobrababel.create_bigg_universal_model(workers=2)
+        assert len(universal.metabolites) == 3
+        assert len(universal.reactions) == 2
+        transport = FakeBigg({'a': ['c', 'e'], 'd': ['c']},
+                             {'R2': [('a', 'c', -1), ('a', 'e', 1)], 'R3': [('a', 'c', -1), ('d', 'c', 1)]}, '2')
+        fake_transport(transport)
+        cobrababel.update_bigg_universal_model(universal)
+        assert set(x.id for x in universal.metabolites) == {'a_c', 'a_e', 'd_c'}
+        assert set(x.id for x in universal.reactions) == {'R2', 'R3'}
+        assert universal.notes['last_updated'] == '2'
+        assert len(transport.urls) == 5
+
+    def test_update_universal_pseudo_reactions(self, fake_transport):
+        fake_transport(FakeBigg({'a': ['c'], 'b': ['c']},
+                                {'R1': [('a', 'c', -1), ('b', 'c', 1)], 'BIOMASS_1': [('a', 'c', -1)]}, '1'))
+        universal = cobrababel.create_bigg_universal_model()
+        assert set(x.id for x in universal.reactions) == {'R1'}
+        assert universal.notes['ignored_reactions'] == 'BIOMASS_1'
+        transport = FakeBigg({'a': ['c'], 'b': ['c']},
+                             {'R1': [('a', 'c', -1), ('b', 'c', 1)], 'BIOMASS_1': [('a', 'c', -1)],
+                              'BIOMASS_2': [('b', 'c', -1)]}, '2')
+        fake_transport(transport)
+        cobrababel.update_bigg_universal_model(universal)
+        assert set(x.id for x in universal.reactions) == {'R1'}
+        assert universal.notes['ignored_reactions'] == 'BIOMASS_1 BIOMASS_2'
+        assert [x.rsplit('/', 1)[1] for x in transport.urls if '/reactions/' in x] == ['BIOMASS_2']
+
+    def test_mirror(self, tmpdir, fake_transport):
+        file_name = str(tmpdir.join('bigg_mirror.db'))
+        transport = FakeBigg({'a': ['c', 'e'], 'b': ['c']}, {'R1': [('a', 'c', -1), ('b', 'c', 1)]}, '1')
+        fake_transport(transport)
+        cobrababel.create_bigg_mirror(file_name, workers=2)
+        assert len(transport.urls) == 6
+        cobrababel.create_bigg_mirror(file_name)
+        assert len(transport.urls) == 9
+        transport = FakeBigg({}, {}, '2')
+        fake_transport(transport)
+        universal = cobrababel.create_bigg_universal_model(source=file_name)
+        assert len(transport.urls) == 0
+        assert universal.notes['last_updated'] == '1'
+        assert set(x.id for x in universal.metabolites) == {'a_c', 'a_e', 'b_c'}
+        assert universal.reactions[0].id == 'R1'
+
+    def test_mirror_other_file(self, tmpdir):
+        file_name = str(tmpdir.join('other.db'))
+        connection = sqlite3.connect(file_name)
+        connection.execute('CREATE TABLE other (name TEXT)')
+        connection.commit()
+        connection.close()
+        with pytest.raises(ValueError):
+            cobrababel.create_bigg_universal_model(source=file_name)
+        connection = sqlite3.connect(file_name)
+        assert [x for x, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")] == ['other']
+        connection.close()
+
+    def test_mirror_batch_commit(self, tmpdir, monkeypatch):
+        file_name = str(tmpdir.join('bigg_mirror_batch.db'))
+        monkeypatch.setattr(cobrababel.bigg, 'MIRROR_COMMIT_COUNT', 2)
+        version = {'bigg_models_version': '1.0', 'last_updated': 'today'}
+        mirror = cobrababel.bigg._BiggMirror(file_name, version)
+        for bigg_id in ['id0', 'id1', 'id2']:
+            mirror.record('metabolite', bigg_id, {'bigg_id': bigg_id})
+        reader = sqlite3.connect(file_name)
+        assert reader.execute('SELECT COUNT(*) FROM metabolites').fetchone()[0] == 2
+        assert mirror.stored_ids('metabolite') == {'id0', 'id1', 'id2'}
+        mirror.close()
+        assert reader.execute('SELECT COUNT(*) FROM metabolites').fetchone()[0] == 3
+        reader.close()
+
+    def test_read_dump(self, tmpdir):
+        file_name = str(tmpdir.join('bigg_dump.json.gz'))
+        records = [{'type': 'version', 'data': {'bigg_models_version': '1.0', 'last_updated': '1'}},
+                   {'type': 'metabolite', 'bigg_id': 'a',
+                    'data': {'bigg_id': 'a', 'name': 'a', 'database_links': {'KEGG Compound': [{'id': 'C1'}]},
+                             'compartments_in_models': [{'bigg_id': 'c'}, {'bigg_id': 'e'}]}},
+                   {'type': 'reaction', 'bigg_id': 'R1',
+                    'data': {'bigg_id': 'R1', 'name': 'R1', 'pseudoreaction': False, 'reaction_string': '&#8652;',
+                             'database_links': {},
+                             'metabolites': [{'bigg_id': 'a', 'compartment_bigg_id': 'c', 'stoichiometry': -1},
+                                             {'bigg_id': 'a', 'compartment_bigg_id': 'e', 'stoichiometry': 1}]}}]
+        with gzip.open(file_name, 'wt') as handle:
+            for record in records:
+                handle.write(json.dumps(record) + '\n')
+        version, metabolites, reactions = cobrababel.read_bigg_dump(file_name)
+        assert version['last_updated'] == '1'
+        assert len(metabolites) == 2
+        assert len(reactions) == 1
+        universal = cobrababel.create_bigg_universal_model(source=file_name)
+        assert len(universal.metabolites) == 2
+        assert universal.reactions.R1.bounds == (-1000.0, 1000.0)
+        aliases = universal.metabolites.a_c.notes['aliases']
+        assert aliases is universal.metabolites.a_e.notes['aliases']
+        assert aliases == {'KEGG Compound': [{'id': 'C1'}]}
+        assert from_json(to_json(universal)).metabolites.a_e.notes['aliases'] == aliases
+        assert from_yaml(to_yaml(universal)).metabolites.a_e.notes['aliases'] == aliases
+
+    def test_read_export(self, data_folder):
+        folder = join(data_folder, 'bigg')
+        with pytest.warns(UserWarning):
+            version, metabolites, reactions = cobrababel.read_bigg_export(
+                join(folder, 'bigg_models_metabolites.txt'), join(folder, 'bigg_models_reactions.txt'))
+        assert len(metabolites) == 7
+        glucose = metabolites[0]
+        assert glucose['bigg_id'] == 'glc__D'
+        assert glucose['compartment_bigg_id'] == 'c'
+        assert [x['id'] for x in glucose['database_links']['CHEBI']] == ['CHEBI:4167', 'CHEBI:17634']
+        assert [x['bigg_id'] for x in reactions] == ['HEX1', 'GLCt2', 'ADK1', 'EX_glc__D_e']
+        assert reactions[3]['pseudoreaction']
+        assert reactions[2]['metabolites'][2] == {'bigg_id': 'adp', 'compartment_bigg_id': 'c', 'stoichiometry': 2.0}
+        with pytest.warns(UserWarning):
+            universal = cobrababel.create_bigg_universal_model(source=folder)
+        assert len(universal.metabolites) == 7
+        assert len(universal.reactions) == 3
+        assert universal.reactions.HEX1.bounds == (0.0, 1000.0)
+        assert universal.reactions.GLCt2.bounds == (-1000.0, 1000.0)
+        assert universal.reactions.ADK1.metabolites[universal.metabolites.adp_c] == 2.0
+        assert universal.notes['ignored_reactions'] == 'EX_glc__D_e'
+
+    def test_download_models(self, tmpdir, fake_transport):
+        folder = str(tmpdir)
+        transport = FakeBiggModels({'m1': make_bigg_model('m1'), 'm2': make_bigg_model('m2')}, '2017-01-01')
+        fake_transport(transport)
+        file_names = cobrababel.download_bigg_models(['m1', {'bigg_id': 'm2'}], folder, workers=2)
+        assert sorted(transport.downloads) == ['m1', 'm2']
+        assert file_names['m1'] == join(folder, 'm1', '2017-01-01.json')
+        cobrababel.download_bigg_models(['m1', 'm2'], folder, workers=2)
+        assert len(transport.downloads) == 2
+        transport.last_updated = '2017-02-01'
+        cobrababel.download_bigg_models(['m2'], folder)
+        assert transport.downloads[2:] == ['m2']
+        with open(join(folder, 'index.json'), 'r') as handle:
+            index = json.load(handle)
+        assert index['m1']['last_updated'] == '2017-01-01'
+        assert index['m2']['file_name'] == join('m2', '2017-02-01.json')
+
+    def test_download_models_error(self, tmpdir, fake_transport):
+        folder = str(tmpdir)
+        fake_transport(FakeBiggModels({'m2': make_bigg_model('m2')}, '2017-01-01'))
+        with pytest.raises(KeyError):
+            cobrababel.download_bigg_models(['m1', 'm2'], folder, workers=1)
+        with open(join(folder, 'index.json'), 'r') as handle:
+            assert list(json.load(handle)) == ['m2']
+
+    def test_load_models(self, tmpdir, fake_transport):
+        folder = str(tmpdir)
+        fake_transport(FakeBiggModels({'m1': make_bigg_model('m1'), 'm2': make_bigg_model('m2')}, '2017-01-01'))
+        cobrababel.download_bigg_models(['m1', 'm2'], folder)
+        models = cobrababel.load_bigg_models(folder, processes=2)
+        assert sorted(models) == ['m1', 'm2']
+        assert models['m1'].name == 'm1 organism'
+        assert models['m1'].notes['source'] == 'BiGG'
+        assert len(models['m2'].reactions) == 1
+        models = cobrababel.load_bigg_models(folder, bigg_ids=['m2'], processes=1)
+        assert list(models) == ['m2']
+        with pytest.raises(ValueError):
+            cobrababel.load_bigg_models(folder, bigg_ids=['m3'])
+        unlink(join(folder, 'm1', '2017-01-01.json'))
+        with pytest.raises(IOError):
+            cobrababel.load_bigg_models(folder)
+
+    def test_create_xrefs(self, tmpdir):
+        model = Model('bigg_test')
+        model.notes['source'] = 'BiGG'
+        cobrababel.add_bigg_metabolites([{'bigg_id': 'glc__D', 'name': 'D-Glucose', 'compartment_bigg_id': 'c',
+                                          'database_links': {'KEGG Compound': [{'id': 'C00031'}],
+                                                             'CHEBI': [{'id': 'CHEBI:4167'}, {'id': 'CHEBI:17634'}]}},
+                                         {'bigg_id': 'h2o', 'name': 'H2O', 'compartment_bigg_id': 'c',
+                                          'database_links': {'KEGG Compound': [{'id': 'C00001'}]}}], model)
+        folder = str(tmpdir.join('bigg_xrefs'))
+        counts = cobrababel.create_bigg_xref_files(model, folder, compress=True)
+        assert counts == {'KEGG Compound': {'reaction': 0, 'metabolite': 2},
+                          'CHEBI': {'reaction': 0, 'metabolite': 2}}
+        with gzip.open(join(folder, 'bigg_kegg_compound_metabolite_xref.tsv.gz'), 'rt') as handle:
+            assert handle.read() == 'bigg\tkegg_compound\nglc__D_c\tC00031\nh2o_c\tC00001\n'
+        with pytest.warns(UserWarning, match='SEED'):
+            counts = cobrababel.create_bigg_xref_files(model, folder, alias_names=['CHEBI', 'SEED'])
+        assert counts == {'CHEBI': {'reaction': 0, 'metabolite': 2}}
+
+    def test_alias_index(self):
+        model = Model('bigg_test')
+        model.notes['source'] = 'BiGG'
+        cobrababel.add_bigg_metabolites([{'bigg_id': 'glc__D', 'name': 'D-Glucose', 'compartment_bigg_id': 'c',
+                                          'database_links': {'KEGG Compound': [{'id': 'C00031'}]}},
+                                         {'bigg_id': 'glc__D', 'name': 'D-Glucose', 'compartment_bigg_id': 'e',
+                                          'database_links': {'KEGG Compound': [{'id': 'C00031'}]}}], model)
+        index = cobrababel.AliasIndex(model)
+        assert index.get_metabolites('KEGG Compound', 'C00031') == {'glc__D_c', 'glc__D_e'}
+        with pytest.raises(AttributeError):
+            index.get_metabolites('KEGG Compound', 'C00031').add('foo_c')
+        assert index.get_aliases('metabolite', 'glc__D_c', 'KEGG Compound') == ('C00031',)
+        aliases = index.get_aliases('metabolite', 'glc__D_c')
+        aliases['CHEBI'] = ('CHEBI:4167',)
+        assert index.get_aliases('metabolite', 'glc__D_c') == {'KEGG Compound': ('C00031',)}
+        expected = [('glc__D_c', ('C00031',)), ('glc__D_e', ('C00031',))]
+        assert index.get_objects_with_alias('metabolite', 'KEGG Compound') == expected
+        assert cobrababel.get_bigg_alias_names(model, index) == {'KEGG Compound'}
+        metabolite = model.metabolites.get_by_id('glc__D_e')
+        metabolite.notes['aliases'] = {'CHEBI': [{'id': 'CHEBI:4167'}]}
+        index.update([metabolite])
+        assert index.get_metabolites('KEGG Compound', 'C00031') == {'glc__D_c'}
+        assert index.get_metabolites('CHEBI', 'CHEBI:4167') == {'glc__D_e'}
+        index.remove([metabolite])
+        assert index.get_alias_names() == {'KEGG Compound'}
+        index.remove([model.metabolites.get_by_id('glc__D_c')])
+        assert index.get_alias_names() == set()
@@ -0,0 +1,32 @@
+from os.path import join
+from shutil import rmtree
+from cobrababel.cache import ResponseCache
+
+
+class TestResponseCache:
+    def test_get_put(self, test_folder):
+        folder = join(test_folder, 'cobrababel_cache')
+        cache = ResponseCache(folder, '1.0')
+        cache.clear()
+        assert cache.get('http://example.org/a') is None
+        cache.put('http://example.org/a', {'bigg_id': 'a'})
+        assert cache.get('http://example.org/a') == {'bigg_id': 'a'}
+        cache = ResponseCache(folder, '1.0')
+        assert cache.get('http://example.org/a') == {'bigg_id': 'a'}
+        cache = ResponseCache(folder, '2.0')
+        assert cache.get('http://example.org/a') is None
+        rmtree(folder)
+
+    def test_eviction(self, test_folder):
+        folder = join(test_folder, 'cobrababel_cache_lru')
+        cache = ResponseCache(folder, '1.0', max_size=60)
+        cache.clear()
+        cache.put('a', {'value': 'a' * 10})
+        cache.put('b', {'value': 'b' * 10})
+        cache.get('a')
+        cache.put('c', {'value': 'c' * 10})
+        assert len(cache) == 2
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert cache.get('c') is not None
+        rmtree(folder)
@@ -1,20 +1,63 @@
 import cobrababel
 from cobra.io import write_sbml_model
-from cobra.io.sbml3 import validate_sbml_model
 from os.path import join
 from os import unlink
+import io
+import gzip
+import pickle
+import sqlite3
+import time
+import requests
 import pytest
 
 
+class FakeMetaNetX:
+    """ Transport that answers MetaNetX file requests from files in a folder. """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.urls = list()
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        response = requests.Response()
+        if kwargs.get('headers', dict()).get('If-None-Match') == '"1"':
+            response.status_code = 304
+            response.raw = io.BytesIO(b'')
+            return response
+        with open(join(self.folder, url[len(cobrababel.metanetx.metanetx_url):]), 'rb') as handle:
+            response.raw = io.BytesIO(handle.read())
+        response.status_code = 200
+        response.headers['ETag'] = '"1"'
+        return response
+
+
+class SlowStream:
+    """ Raw response stream that is slow to send many small chunks. """
+
+    def __init__(self, count):
+        self.count = count
+        self.reads = 0
+
+    def read(self, size=-1, **kwargs):
+        self.reads += 1
+        if self.reads > self.count:
+            return b''
+        time.sleep(0.01)
+        return b'#MNXref Version 2017/05/04\n' if self.reads == 1 else b'#\n'
+
+
 class TestMetaNetX:
     def test_create_universal(self, test_folder):
+        # Newer versions of cobra do not have the sbml3 module so only skip this test.
+        sbml3 = pytest.importorskip('cobra.io.sbml3')
         universal = cobrababel.create_metanetx_universal_model()
         assert universal.id == 'metanetx_universal'
         assert len(universal.reactions) >= 42952
         assert len(universal.metabolites) >= 31130
         file_name = join(test_folder, 'metanetx.xml')
         write_sbml_model(universal, file_name)
-        model, errors = validate_sbml_model(file_name)
+        model, errors = sbml3.validate_sbml_model(file_name)
         assert len(errors['other']) == 0
         assert len(errors['SBML errors']) == 0
         assert len(errors['warnings']) == 0
@@ -37,3 +80,242 @@ class TestMetaNetX:
         file_name = join(test_folder, 'metanetx_reaction_xref.tsv')
         with pytest.raises(ValueError):
             cobrababel.create_metanetx_reaction_xref('foobar', file_name)
+
+    def test_cache(self, data_folder, tmpdir, fake_transport):
+        cache_folder = str(tmpdir.join('metanetx_cache'))
+        file_name = str(tmpdir.join('metanetx_metabolite_xref.tsv'))
+        transport = FakeMetaNetX(join(data_folder, 'metanetx'))
+        fake_transport(transport)
+        cobrababel.create_metanetx_metabolite_xref('bigg', file_name, cache_folder=cache_folder)
+        cobrababel.create_metanetx_metabolite_xref('kegg', file_name, cache_folder=cache_folder)
+        assert len(transport.urls) == 1
+        cobrababel.create_metanetx_metabolite_xref('kegg', file_name, cache_folder=cache_folder, revalidate=True)
+        assert len(transport.urls) == 2
+        with open(file_name) as handle:
+            assert handle.read().count('\n') == 7
+
+    def test_snapshot(self, data_folder, tmpdir, fake_transport):
+        folder = str(tmpdir.join('metanetx_snapshot'))
+        fake_transport(FakeMetaNetX(join(data_folder, 'metanetx')))
+        universal = cobrababel.create_metanetx_universal_model()
+        cobrababel.save_metanetx_snapshot(universal, folder)
+        snapshot = cobrababel.load_metanetx_snapshot(folder)
+        assert [x.id for x in snapshot.reactions] == [x.id for x in universal.reactions]
+        assert set(x.id for x in snapshot.metabolites) == set(x.id for x in universal.metabolites)
+        reaction = snapshot.reactions.get_by_id('MNXR101')
+        assert reaction.notes == universal.reactions.get_by_id('MNXR101').notes
+        assert dict((x.id, y) for x, y in reaction.metabolites.items()) == \
+            dict((x.id, y) for x, y in universal.reactions.get_by_id('MNXR101').metabolites.items())
+        metabolite = snapshot.metabolites.get_by_id('MNXM3_MNXD1')
+        assert metabolite.charge == -4
+        assert metabolite.notes == universal.metabolites.get_by_id('MNXM3_MNXD1').notes
+        subset = cobrababel.load_metanetx_snapshot(folder, reaction_ids=['MNXR102'])
+        assert set(x.id for x in subset.metabolites) == {'MNXM41_MNXD1', 'MNXM41_MNXD2'}
+
+    def test_parse_processes(self, data_folder, fake_transport):
+        fake_transport(FakeMetaNetX(join(data_folder, 'metanetx')))
+        serial = cobrababel.create_metanetx_universal_model()
+        parallel = cobrababel.create_metanetx_universal_model(processes=2)
+        assert [x.id for x in parallel.reactions] == [x.id for x in serial.reactions]
+        for reaction in serial.reactions:
+            assert dict((x.id, y) for x, y in parallel.reactions.get_by_id(reaction.id).metabolites.items()) == \
+                dict((x.id, y) for x, y in reaction.metabolites.items())
+
+    def test_used_metabolites(self, data_folder, fake_transport):
+        fake_transport(FakeMetaNetX(join(data_folder, 'metanetx')))
+        universal = cobrababel.create_metanetx_universal_model()
+        assert len(universal.reactions) == 5
+        assert len(universal.metabolites) == 10
+        assert 'MNXM99999' not in set(x.id.split('_')[0] for x in universal.metabolites)
+        assert universal.metabolites.get_by_id('MNXM41_MNXD2').notes['InChIKey'] == 'WQZGKKKJIJFFOK-GASJEMHNSA-N'
+
+    def test_download_workers(self, data_folder, tmpdir, fake_transport):
+        cache_folder = str(tmpdir.join('metanetx_cache'))
+        transport = FakeMetaNetX(join(data_folder, 'metanetx'))
+        fake_transport(transport)
+        serial = cobrababel.create_metanetx_universal_model()
+        concurrent = cobrababel.create_metanetx_universal_model(workers=3)
+        cobrababel.create_metanetx_universal_model(cache_folder=cache_folder, workers=3)
+        assert len(transport.urls) == 9
+        assert [x.id for x in concurrent.reactions] == [x.id for x in serial.reactions]
+        assert set(x.id for x in concurrent.metabolites) == set(x.id for x in serial.metabolites)
+
+    def test_download_workers_error(self, data_folder, monkeypatch, fake_transport):
+        transport = FakeMetaNetX(join(data_folder, 'metanetx'))
+        stream = SlowStream(500)
+        get = transport.get
+
+        def get_endless(url, **kwargs):
+            response = get(url, **kwargs)
+            if url.endswith('chem_prop.tsv'):
+                response.raw = stream
+            return response
+        transport.get = get_endless
+        fake_transport(transport)
+
+        def read_reactions(*args, **kwargs):
+            while stream.reads == 0:
+                time.sleep(0.01)
+            raise ValueError('Bad reaction file')
+        monkeypatch.setattr(cobrababel.metanetx, '_read_metanetx_reactions', read_reactions)
+        with pytest.raises(ValueError):
+            cobrababel.create_metanetx_universal_model(workers=3)
+        assert stream.reads < 50
+
+    def test_filters(self, data_folder, fake_transport):
+        fake_transport(FakeMetaNetX(join(data_folder, 'metanetx')))
+        cytosol = cobrababel.create_metanetx_universal_model(compartments=['MNXD1'])
+        balanced = cobrababel.create_metanetx_universal_model(balanced_only=True)
+        bigg = cobrababel.create_metanetx_universal_model(source_namespaces=['bigg'])
+        kinase = cobrababel.create_metanetx_universal_model(ec_prefixes=['2.7.1'])
+        hydrolase = cobrababel.create_metanetx_universal_model(ec_prefixes=['3.'], balanced_only=True)
+        assert [x.id for x in cytosol.reactions] == ['MNXR100', 'MNXR101', 'MNXR103']
+        assert set(x.compartment for x in cytosol.metabolites) == {'MNXD1'}
+        assert [x.id for x in balanced.reactions] == ['MNXR100', 'MNXR101', 'MNXR102', 'MNXR105']
+        assert [x.id for x in bigg.reactions] == ['MNXR100', 'MNXR102']
+        assert [x.id for x in kinase.reactions] == ['MNXR101']
+        assert len(kinase.metabolites) == 5
+        assert [x.id for x in hydrolase.reactions] == ['MNXR100']
+
+    def test_filter_line_numbers(self, data_folder, fake_transport):
+        fake_transport(FakeMetaNetX(join(data_folder, 'metanetx')))
+        for processes in [1, 2]:
+            with pytest.warns(UserWarning) as record:
+                cobrababel.create_metanetx_universal_model(verbose=True, balanced_only=True, processes=processes)
+            messages = [str(x.message) for x in record if 'MNXR104' in str(x.message)]
+            assert len(messages) == 1
+            assert 'on line 4:' in messages[0]
+
+    def test_create_xrefs(self, data_folder, tmpdir, fake_transport):
+        folder = str(tmpdir.join('metanetx_xrefs'))
+        transport = FakeMetaNetX(join(data_folder, 'metanetx'))
+        fake_transport(transport)
+        counts = cobrababel.create_metanetx_xref_files(folder)
+        assert len(transport.urls) == 2
+        assert counts == {'bigg': {'metabolite': 7, 'reaction': 3}, 'kegg': {'metabolite': 6, 'reaction': 2},
+                          'chebi': {'metabolite': 1, 'reaction': 0}, 'rhea': {'metabolite': 0, 'reaction': 1}}
+        with open(join(folder, 'metanetx_kegg_reaction_xref.tsv')) as handle:
+            assert handle.read() == 'metanetx\tkegg\nMNXR100\tR00086\nMNXR101\tR00299\n'
+        with pytest.warns(UserWarning):
+            counts = cobrababel.create_metanetx_xref_files(folder, namespaces=['bigg', 'foobar'], compress=True)
+        assert list(counts) == ['bigg']
+        with gzip.open(join(folder, 'metanetx_bigg_metabolite_xref.tsv.gz'), 'rt') as handle:
+            assert handle.read().count('\n') == 8
+
+    def test_xref_index(self, data_folder, fake_transport):
+        fake_transport(FakeMetaNetX(join(data_folder, 'metanetx')))
+        xref = cobrababel.MetaNetXXref('metabolite')
+        reaction_xref = cobrababel.MetaNetXXref('reaction')
+        assert len(xref) == 14
+        assert xref.get_namespaces() == {'bigg', 'kegg', 'chebi'}
+        assert xref.get_mnx_ids('kegg', 'C00001') == ['MNXM2']
+        assert xref.get_mnx_ids('kegg', 'C99999') == []
+        assert xref.get_external_ids('MNXM2', 'kegg') == ['C00001', 'C01328']
+        assert xref.get_external_ids('MNXM2', 'kegg', evidence=['identity']) == ['C00001']
+        assert xref.get_mnx_id_map('bigg', ['glc__D', 'g6p', 'foo']) == {'glc__D': ['MNXM41'], 'g6p': ['MNXM160']}
+        assert xref.get_external_id_map(['MNXM41', 'MNXM9'], 'kegg') == {'MNXM41': ['C00031', 'C00267']}
+        assert xref.get_details('kegg', 'C00267') == \
+            [{'mnx_id': 'MNXM41', 'evidence': 'inferred', 'description': 'alpha-D-Glucose'}]
+        assert reaction_xref.get_mnx_ids('rhea', '16689') == ['MNXR103']
+        for row in range(len(xref)):
+            assert row in xref._xref_rows(*xref.xrefs[row].split(':', 1))
+        copy = pickle.loads(pickle.dumps(xref))
+        assert copy.get_external_ids('MNXM41', 'kegg') == ['C00031', 'C00267']
+        assert copy.get_mnx_ids('bigg', 'atp') == ['MNXM3']
+        with pytest.raises(ValueError):
+            cobrababel.MetaNetXXref('compartment')
+
+    def test_annotation_file_error(self, data_folder, tmpdir, monkeypatch, fake_transport):
+        file_name = str(tmpdir.join('metanetx_annotations.db'))
+
+        def fail(*args, **kwargs):
+            raise ValueError('Compartment file is not valid')
+        monkeypatch.setattr(cobrababel.metanetx, '_read_metanetx_compartments', fail)
+        fake_transport(FakeMetaNetX(join(data_folder, 'metanetx')))
+        with pytest.raises(ValueError):
+            cobrababel.create_metanetx_universal_model(annotation_file=file_name)
+        assert tmpdir.listdir() == []
+
+    def test_annotation_file_open_error(self, data_folder, tmpdir, fake_transport):
+        file_name = str(tmpdir.join('missing', 'metanetx_annotations.db'))
+        transport = FakeMetaNetX(join(data_folder, 'metanetx'))
+        fake_transport(transport)
+        with pytest.raises(sqlite3.OperationalError):
+            cobrababel.create_metanetx_universal_model(annotation_file=file_name, workers=3)
+        assert transport.urls == []
+
+    def test_download_line_endings(self, tmpdir, fake_transport):
+        with io.open(str(tmpdir.join('chem_prop.tsv')), 'w', encoding='utf-8', newline='') as handle:
+            handle.write(u'#MNXref Version 2017/05/04\r\n#MNX_ID\tDescription\r\n'
+                         u'MNXM1\tH(+) \u2028line\r\nMNXM2\tH2O \x1cgroup\r\nMNXM3\tATP \rcarriage\r\nMNXM4\tADP')
+        fake_transport(FakeMetaNetX(str(tmpdir)))
+        expected = [[u'MNXM1', u'H(+) \u2028line'], [u'MNXM2', u'H2O \x1cgroup'], [u'MNXM3', u'ATP \rcarriage'],
+                    [u'MNXM4', u'ADP']]
+        assert list(cobrababel.metanetx._download_metanetx_file('chem_prop.tsv')) == expected
+        cache_folder = str(tmpdir.join('metanetx_cache'))
+        assert list(cobrababel.metanetx._download_metanetx_file('chem_prop.tsv', cache_folder)) == expected
+
+    def test_xref_download_error(self, tmpdir):
+        file_name = str(tmpdir.join('metanetx_metabolite_xref.tsv'))
+
+        def xref_list():
+            yield ['kegg:C00001', 'MNXM2', 'identity', 'H2O']
+            raise requests.ConnectionError('Connection dropped')
+        with pytest.raises(requests.ConnectionError):
+            cobrababel.metanetx._process_metanetx_xref(xref_list(), 'kegg', file_name)
+        assert tmpdir.listdir() == []
+        cobrababel.metanetx._process_metanetx_xref(iter([['kegg:C00001', 'MNXM2', 'identity', 'H2O']]), 'kegg',
+                                                   file_name)
+        with open(file_name, 'r') as handle:
+            assert handle.read() == 'metanetx\tkegg\nMNXM2\tC00001\n'
+
+    def test_parse_equation(self):
+        equation = '1 MNXM2@MNXD1 + 1 MNXM3@MNXD1 = 1 MNXM1@MNXD1 + 0.5 MNXM7@MNXD1'
+        metabolites = cobrababel.metanetx._parse_metanetx_equation(equation)
+        assert metabolites['MNXM3_MNXD1'] == {'mnx_id': 'MNXM3', 'coefficient': -1.0, 'compartment': 'MNXD1'}
+        assert metabolites['MNXM7_MNXD1']['coefficient'] == 0.5
+        assert cobrababel.metanetx._parse_metanetx_equation('(n) MNXM2@MNXD1 = (n) MNXM2@MNXD2') is None
+        assert cobrababel.metanetx._parse_metanetx_equation('1 MNXM2@MNXD1 + foo = 1 MNXM2@MNXD2') is None
+        assert cobrababel.metanetx._parse_metanetx_equation('1 MNXM1@MNXD1 1 MNXM2@MNXD1 + foo = 1 MNXM2@MNXD2') is None
+        assert cobrababel.metanetx._parse_metanetx_equation('1 MNXM1@MNXD1 2 MNXM2@MNXD1 = 1 MNXM2@MNXD2') is None
+        assert cobrababel.metanetx._parse_metanetx_equation('1 MNXM1@MNXD1 = 1 MNXM2@MNXD2 + ') is None
+        before = cobrababel.get_metanetx_equation_cache_stats()
+        cobrababel.metanetx._parse_metanetx_equation('1 MNXM1@MNXD1 + 0.5 MNXM7@MNXD1 = 1 MNXM2@MNXD1')
+        stats = cobrababel.get_metanetx_equation_cache_stats()
+        assert stats['hits'] == before['hits'] + 1
+        assert stats['misses'] == before['misses'] + 1
+        assert 0.0 < stats['hit_rate'] <= 1.0
+
+    def test_equation_cache_eviction(self, monkeypatch):
+        monkeypatch.setattr(cobrababel.metanetx, 'HALF_EQUATION_CACHE_SIZE', 2)
+        monkeypatch.setattr(cobrababel.metanetx, '_half_equation_cache', cobrababel.metanetx.OrderedDict())
+        parse = cobrababel.metanetx._parse_metanetx_half_equation
+        parse('1 MNXM1@MNXD1')
+        parse('1 MNXM2@MNXD1')
+        parse('1 MNXM1@MNXD1')
+        parse('1 MNXM3@MNXD1')
+        assert list(cobrababel.metanetx._half_equation_cache) == ['1 MNXM1@MNXD1', '1 MNXM3@MNXD1']
+
+    def test_annotation_file(self, data_folder, tmpdir, fake_transport):
+        file_name = str(tmpdir.join('metanetx_annotations.db'))
+        folder = str(tmpdir.join('metanetx_snapshot'))
+        fake_transport(FakeMetaNetX(join(data_folder, 'metanetx')))
+        universal = cobrababel.create_metanetx_universal_model(annotation_file=file_name)
+        assert universal.notes['annotation_file'] == file_name
+        metabolite = universal.metabolites.get_by_id('MNXM41_MNXD2')
+        assert 'InChI' not in metabolite.notes
+        assert metabolite.notes['mass'] == 180.15588
+        annotations = cobrababel.MetaNetXAnnotations(universal.notes['annotation_file'])
+        assert len(annotations) == 7
+        assert annotations.get_metabolite(metabolite)['InChIKey'] == 'WQZGKKKJIJFFOK-GASJEMHNSA-N'
+        assert annotations.get('MNXM3')['source'] == 'chebi:30616'
+        assert annotations.get('MNXM99999') is None
+        assert set(annotations.get_many(['MNXM1', 'MNXM2', 'MNXM99999'])) == {'MNXM1', 'MNXM2'}
+        copy = pickle.loads(pickle.dumps(annotations))
+        assert copy.get('MNXM1')['SMILES'] == '[H+]'
+        cobrababel.save_metanetx_snapshot(universal, folder)
+        snapshot = cobrababel.load_metanetx_snapshot(folder)
+        assert snapshot.notes['annotation_file'] == file_name
+        assert 'InChI' not in snapshot.metabolites.get_by_id('MNXM41_MNXD2').notes
+        annotations.close()
+        copy.close()
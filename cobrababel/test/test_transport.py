@@ -0,0 +1,71 @@
+import cobrababel
+import cobrababel.transport
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+
+class TestTransport:
+    def test_set_transport(self):
+        original = cobrababel.get_transport()
+        transport = cobrababel.Transport(max_connections_per_host=4)
+        cobrababel.set_transport(transport)
+        try:
+            assert cobrababel.get_transport() is transport
+            assert transport.session.get_adapter('http://bigg.ucsd.edu')._pool_maxsize == 4
+        finally:
+            cobrababel.set_transport(original)
+
+    def test_retry(self, monkeypatch):
+        delays = list()
+        monkeypatch.setattr(cobrababel.transport, 'sleep', delays.append)
+        transport = cobrababel.Transport(rate_limits={}, max_retries=2)
+        responses = list()
+
+        class FakeResponse:
+            def __init__(self, status_code, headers):
+                self.status_code = status_code
+                self.headers = headers
+
+            def close(self):
+                pass
+
+        def fake_get(url, **kwargs):
+            responses.append((url, kwargs['timeout']))
+            if len(responses) == 1:
+                return FakeResponse(429, {'Retry-After': '3600'})
+            if len(responses) == 2:
+                return FakeResponse(503, {})
+            return FakeResponse(200, {})
+        monkeypatch.setattr(transport.session, 'get', fake_get)
+        assert transport.get('http://bigg.ucsd.edu/api/v2/models').status_code == 200
+        assert len(responses) == 3
+        assert responses[0][1] == cobrababel.transport.REQUEST_TIMEOUT
+        assert delays[0] == cobrababel.transport.RETRY_MAX_DELAY
+        transport.get('http://bigg.ucsd.edu/api/v2/models', timeout=5.0)
+        assert responses[-1][1] == 5.0
+
+    def test_rate_limiter(self):
+        limiter = cobrababel.transport.RateLimiter(100.0, burst=2)
+        limiter.acquire()
+        limiter.acquire()
+        assert limiter.tokens < 1.0
+        limiter.backoff(0.01)
+        assert limiter.rate == 50.0
+        limiter.acquire()
+        limiter.success()
+        assert limiter.rate == 55.0
+
+    def test_get_transport_threads(self, monkeypatch):
+        created = list()
+
+        class SlowTransport(object):
+            def __init__(self):
+                time.sleep(0.05)
+                created.append(self)
+
+        monkeypatch.setattr(cobrababel.transport, '_transport', None)
+        monkeypatch.setattr(cobrababel.transport, 'Transport', SlowTransport)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            transports = list(executor.map(lambda x: cobrababel.get_transport(), range(8)))
+        assert len(created) == 1
+        assert all(x is created[0] for x in transports)
@@ -0,0 +1,301 @@
+import requests
+from requests.adapters import HTTPAdapter
+from threading import Lock
+from time import sleep, time
+from email.utils import parsedate_tz, mktime_tz
+import random
+import logging
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+try:
+    from time import monotonic
+except ImportError:
+    monotonic = time
+
+# Number of hosts with a pool of connections kept open
+POOL_HOSTS = 10
+
+# Maximum number of open connections to one host
+MAX_CONNECTIONS_PER_HOST = 10
+
+# Default limits in requests per second for source system web services (the rate never goes
+# above the limit so change it with Transport.set_rate_limit() when a server allows more requests)
+RATE_LIMITS = {
+    'bigg.ucsd.edu': 10.0,
+    'rest.kegg.jp': 3.0
+}
+
+# Response status codes for requests that are tried again
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Maximum number of times to try a request again
+MAX_RETRIES = 5
+
+# Base and maximum delay in seconds between tries of a request
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+# Seconds to wait for a connection to a host and for data from a host
+REQUEST_TIMEOUT = (10.0, 120.0)
+
+# Logger for this module
+LOGGER = logging.getLogger(__name__)
+
+# Transport used by all of the source system clients
+_transport = None
+
+# Lock for creating the transport the first time it is used
+_transport_lock = Lock()
+
+
+class RateLimiter(object):
+    """ Token bucket that limits the rate of requests to a host.
+
+    The rate is cut in half when the host says it is overloaded and slowly
+    increases back to the maximum rate as requests succeed. The rate never goes
+    above the maximum rate even when the host is idle. All of the threads
+    sending requests to the host wait when the host asks to back off.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None):
+        """ Initialize object.
+
+        Parameters
+        ----------
+        rate : float
+            Maximum number of requests per second
+        burst : int, optional
+            Maximum number of requests sent at once after an idle period
+        min_rate : float, optional
+            Minimum number of requests per second after backing off
+        """
+
+        self.max_rate = float(rate)
+        self.min_rate = float(min_rate) if min_rate is not None else self.max_rate / 16.0
+        self.rate = self.max_rate
+        self.capacity = float(burst) if burst is not None else max(1.0, self.max_rate)
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self.blocked_until = 0.0
+        self._lock = Lock()
+        return
+
+    def acquire(self):
+        """ Wait until a request can be sent. """
+
+        while True:
+            with self._lock:
+                now = monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                elif self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                else:
+                    delay = (1.0 - self.tokens) / self.rate
+            sleep(delay)
+
+    def backoff(self, delay):
+        """ Slow down after the host says it is overloaded.
+
+        Parameters
+        ----------
+        delay : float
+            Number of seconds to wait before sending the next request
+        """
+
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2.0)
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, monotonic() + delay)
+        return
+
+    def success(self):
+        """ Speed up after a request succeeds. """
+
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20.0)
+        return
+
+
+class Transport(object):
+    """ HTTP transport shared by the clients for the source systems.
+
+    Connections are kept alive and reused between requests to the same host
+    and responses are requested with gzip transfer encoding. Requests to a host
+    with a rate limit wait for the host's rate limiter and requests that fail
+    because the host is overloaded or unavailable are tried again.
+    """
+
+    def __init__(self, pool_hosts=POOL_HOSTS, max_connections_per_host=MAX_CONNECTIONS_PER_HOST,
+                 rate_limits=None, max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT):
+        """ Initialize object.
+
+        Parameters
+        ----------
+        pool_hosts : int, optional
+            Number of hosts with a pool of connections kept open
+        max_connections_per_host : int, optional
+            Maximum number of open connections to one host
+        rate_limits : dict, optional
+            Dictionary keyed by host name of maximum requests per second (default is RATE_LIMITS)
+        max_retries : int, optional
+            Maximum number of times to try a request again
+        timeout : float or tuple, optional
+            Seconds to wait for a connection and for data when a request does not set a timeout
+        """
+
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.rate_limiters = dict()
+        if rate_limits is None:
+            rate_limits = RATE_LIMITS
+        for host in rate_limits:
+            self.set_rate_limit(host, rate_limits[host])
+
+        self.session = requests.Session()
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=max_connections_per_host,
+                              pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        return
+
+    def get(self, url, **kwargs):
+        """ Send a GET request.
+
+        Parameters
+        ----------
+        url : str
+            URL of request
+        kwargs : dict
+            Keyword arguments passed to requests.Session.get()
+
+        Returns
+        -------
+        requests.Response
+            Response from server
+        """
+
+        # A stalled connection would hold a connection from the pool forever without a timeout.
+        kwargs.setdefault('timeout', self.timeout)
+        limiter = self.rate_limiters.get(urlparse(url).hostname)
+        attempt = 0
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+            LOGGER.debug('Sent GET request to %s', url)
+            response = self.session.get(url, **kwargs)
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                break
+
+            # Wait as long as the host asks or back off exponentially with jitter.
+            delay = _retry_after(response)
+            if delay is None:
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            attempt += 1
+            LOGGER.warning('Request to %s failed with status %d, trying again in %.1f seconds (%d of %d)',
+                           url, response.status_code, delay, attempt, self.max_retries)
+            response.close()
+            if limiter is not None:
+                limiter.backoff(delay)
+            else:
+                sleep(delay)
+
+        if limiter is not None and response.status_code < 400:
+            limiter.success()
+        return response
+
+    def set_rate_limit(self, host, rate, burst=None):
+        """ Set the rate limit for requests to a host.
+
+        Parameters
+        ----------
+        host : str
+            Name of host
+        rate : float or None
+            Maximum number of requests per second or None for no limit
+        burst : int, optional
+            Maximum number of requests sent at once after an idle period
+        """
+
+        if rate is None:
+            self.rate_limiters.pop(host, None)
+        else:
+            self.rate_limiters[host] = RateLimiter(rate, burst)
+        return
+
+    def close(self):
+        """ Close all of the open connections. """
+
+        self.session.close()
+        return
+
+
+def get_transport():
+    """ Get the transport used by the source system clients.
+
+    Returns
+    -------
+    Transport
+        Current transport object
+    """
+
+    global _transport
+    if _transport is None:
+        # Only one thread creates the transport so all threads share the same rate limiters.
+        with _transport_lock:
+            if _transport is None:
+                _transport = Transport()
+    return _transport
+
+
+def set_transport(transport):
+    """ Set the transport used by the source system clients.
+
+    Parameters
+    ----------
+    transport : Transport
+        Object with a get() method that accepts the same arguments as requests.get()
+    """
+
+    global _transport
+    with _transport_lock:
+        _transport = transport
+    return
+
+
+def _retry_after(response):
+    """ Get the number of seconds to wait from the Retry-After header of a response.
+
+    The delay is limited to RETRY_MAX_DELAY so a host cannot stall a request for a long time.
+
+    Parameters
+    ----------
+    response : requests.Response
+        Response from server
+
+    Returns
+    -------
+    float or None
+        Number of seconds to wait or None if the header is not available
+    """
+
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        date = parsedate_tz(value)
+        if date is None:
+            return None
+        delay = mktime_tz(date) - time()
+    return min(RETRY_MAX_DELAY, max(0.0, delay))
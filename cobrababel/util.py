@@ -1,3 +1,14 @@
+import gzip
+from os import listdir, rename, unlink
+from os.path import exists, join
+from six import PY2
+
+try:
+    from os import replace as _replace
+except ImportError:
+    _replace = None
+
+
 def format_long_string(string, max_length):
     """ Format a string so it fits in column of a specific width.
 
@@ -44,3 +55,54 @@ def get_models_in_folder(source_folder):
                 filename.endswith('.sbml') or filename.endswith('.json'):
             source_models.append(join(source_folder, filename))
     return source_models
+
+
+def replace_file(source, destination):
+    """ Rename a file and replace the destination file if it exists.
+
+    Parameters
+    ----------
+    source : str
+        Path to file to rename
+    destination : str
+        Path to new name of file
+    """
+
+    if _replace is not None:
+        _replace(source, destination)
+        return
+    try:
+        rename(source, destination)
+    except OSError:
+        # Windows does not allow renaming over an existing file.
+        if not exists(destination):
+            raise
+        unlink(destination)
+        rename(source, destination)
+
+
+def open_gzip_text(file_name, mode='r', compresslevel=9, newline=None):
+    """ Open a gzip compressed file for reading or writing text.
+
+    Parameters
+    ----------
+    file_name : str
+        Path to gzip compressed file
+    mode : {'r', 'w'}
+        Open the file for reading or writing
+    compresslevel : int, optional
+        Compression level used when writing the file
+    newline : str, optional
+        Line ending used to split lines with the same meaning as for io.open()
+        (Python 2 files are always split only on newline characters)
+
+    Returns
+    -------
+    file
+        File handle for reading or writing text in the file
+    """
+
+    # Python 2 gzip files do not have a text mode but str is already bytes.
+    if PY2:
+        return gzip.open(file_name, mode + 'b', compresslevel)
+    return gzip.open(file_name, mode + 't', compresslevel, encoding='utf-8', newline=newline)
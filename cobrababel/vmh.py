@@ -8,6 +8,8 @@ import io
 
 from cobra.io import read_sbml_model, load_matlab_model
 
+from .transport import get_transport
+
 # Base URL for Virtual Metabolic Human website
 vmh_url = 'https://webdav-r3lab.uni.lu/public/msp/'
 
@@ -32,7 +34,7 @@ def create_cobra_model_from_agora_model(agora_name, validate=False):
     """
 
     # Download the SBML file.
-    response = requests.get('{0}AGORA/sbml/{1}.xml'.format(vmh_url, agora_name))
+    response = get_transport().get('{0}AGORA/sbml/{1}.xml'.format(vmh_url, agora_name))
     if response.status_code != requests.codes.OK:
         response.raise_for_status()
 
@@ -63,7 +65,7 @@ def create_cobra_model_from_vmh_recon2(validate=False):
     """
 
     # Download the zip file that contains the Matlab file and extract it.
-    response = requests.get('{0}{1}_.zip'.format(vmh_url, recon2_file_name), stream=True)
+    response = get_transport().get('{0}{1}_.zip'.format(vmh_url, recon2_file_name), stream=True)
     if response.status_code != requests.codes.OK:
         response.raise_for_status()
     zipfile.ZipFile(io.BytesIO(response.content), 'r').extract(recon2_file_name, gettempdir())
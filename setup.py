@@ -7,7 +7,8 @@ requirements = [
     'fuzzywuzzy>=0.10.0',
     'requests',
     'tabulate',
-    'numpy>=1.6'
+    'numpy>=1.6',
+    'futures; python_version < "3.0"'
 ]
 
 try: